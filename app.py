@@ -1,39 +1,171 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, request, jsonify, render_template, send_from_directory, Response
 from flask_cors import CORS
-import yt_dlp
+import argparse
 import threading
 import os
-import subprocess
-import sys
-import requests
-from io import BytesIO
 import time
 import json
+import re
+import select
+import socket
 import uuid
+import copy
+from concurrent.futures import ThreadPoolExecutor
 from werkzeug.utils import secure_filename
+from metadata_cache import MetadataCache, normalize_video_id, cache_key
+from download_scheduler import DownloadScheduler, QueueFullError
+from progress_store import create_progress_store
+from job_journal import JobJournal
+from media_store import MediaStore, media_key
+from downloader_core import FormatIndex, format_options, youtube_summary, instagram_summary
+from postprocess import PostprocessTask, AUDIO_CODECS, ffmpeg_available
+from session_pool import SessionPool, PLATFORM_EXTRACTORS
+from thumbnail_cache import ThumbnailCache, snap_width
+from extraction_executor import ExtractionExecutor, ExtractionTimeout, ExtractionCancelled
 
 app = Flask(__name__)
 CORS(app)
 
-# Global variables to track download progress
-download_progress = {}
-active_downloads = {}
+# Let a fronting web server (nginx, Apache) deliver finished files via X-Sendfile
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+
+# Progress of queued, running and recently finished downloads.
+# Use JOB_STATE_BACKEND=sqlite when running several worker processes.
+progress_store = create_progress_store(
+    os.environ.get('JOB_STATE_BACKEND', 'memory'),
+    path=os.environ.get('JOB_STATE_DB', 'jobs.db'),
+    max_entries=int(os.environ.get('PROGRESS_STORE_SIZE', 10000)),
+    finished_ttl=int(os.environ.get('FINISHED_JOB_TTL', 3600))
+)
+
+# Unfinished jobs, kept on disk so they are queued again after a restart
+job_journal = JobJournal(os.environ.get('JOB_JOURNAL_DB', 'journal.db'))
+RESUME_JOBS = os.environ.get('RESUME_JOBS', '1').lower() in ('1', 'true', 'yes')
+
+# Size of the chunks relayed by /api/stream, and whether relayed files are kept in the media store
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', 256 * 1024))
+STREAM_TO_CACHE = os.environ.get('STREAM_TO_CACHE', '1').lower() in ('1', 'true', 'yes')
+
+# Upper bound on events per second sent to each progress stream
+PROGRESS_STREAM_MAX_RATE = float(os.environ.get('PROGRESS_STREAM_MAX_RATE', 4))
+
+# Each open progress stream holds a request thread. Streams end after
+# PROGRESS_STREAM_DURATION seconds (the browser reconnects) and at most
+# MAX_PROGRESS_STREAMS are open at once, a quarter of WEB_THREADS by default;
+# beyond that clients get HTTP 503 and poll /api/progress instead.
+PROGRESS_STREAM_DURATION = float(os.environ.get('PROGRESS_STREAM_DURATION', 25))
+MAX_PROGRESS_STREAMS = int(os.environ.get('MAX_PROGRESS_STREAMS',
+                                          max(1, int(os.environ.get('WEB_THREADS', 32)) // 4)))
+progress_stream_slots = threading.BoundedSemaphore(MAX_PROGRESS_STREAMS)
+
+# Fetch large single-stream downloads over several HTTP connections
+SEGMENTED_DOWNLOADS = os.environ.get('SEGMENTED_DOWNLOADS', '').lower() in ('1', 'true', 'yes')
+SEGMENT_CONNECTIONS = int(os.environ.get('SEGMENT_CONNECTIONS', 4))
+SEGMENTED_MIN_SIZE = int(os.environ.get('SEGMENTED_MIN_SIZE', 8 * 1024 * 1024))
+
+# Fetch the video and audio streams of a merged download at the same time
+PARALLEL_STREAMS = os.environ.get('PARALLEL_STREAMS', '1').lower() in ('1', 'true', 'yes')
+
+# Video IDs accepted by /api/thumbnail
+THUMBNAIL_ID_RE = re.compile(r'[0-9A-Za-z_-]{1,64}')
+
+# Platforms the API accepts
+PLATFORMS = ('youtube', 'instagram')
+
+# Audio-only downloads are converted to mp3 or kept as m4a
+AUDIO_FORMATS = ('mp3', 'm4a')
+
+# Batch items queue behind interactive downloads, in their own bounded queue
+BATCH_PRIORITY = 1
+MAX_BATCH_ITEMS = int(os.environ.get('MAX_BATCH_ITEMS', 200))
+MAX_QUEUED_BATCH_ITEMS = int(os.environ.get('MAX_QUEUED_BATCH_ITEMS', 1000))
+
+# Warm yt-dlp sessions per platform, reused by info extraction and downloads.
+# Options yt-dlp only reads at construction time go in the base options.
+# With RESTRICT_EXTRACTORS sessions only load the extractors of their platform.
+YTDL_SESSIONS_PER_PLATFORM = int(os.environ.get('YTDL_SESSIONS_PER_PLATFORM', 8))
+RESTRICT_EXTRACTORS = os.environ.get('RESTRICT_EXTRACTORS', '1').lower() in ('1', 'true', 'yes')
+ydl_base_options = {
+    'youtube': {'quiet': True, 'no_warnings': True},
+    'instagram': {
+        'quiet': True,
+        'no_warnings': True,
+        'http_headers': {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        }
+    }
+}
+ydl_sessions = {
+    platform: SessionPool(options, max_idle=YTDL_SESSIONS_PER_PLATFORM,
+                          extractors=[PLATFORM_EXTRACTORS[platform]] if RESTRICT_EXTRACTORS else None)
+    for platform, options in ydl_base_options.items()
+}
+
+# Load yt-dlp and build a session per platform in a background thread at
+# startup, so the server answers right away and the first extraction doesn't
+# pay for the imports. PRELOAD=1 (or `python app.py --preload`) does it before
+# the server, or each gunicorn worker, starts taking requests instead.
+WARM_UP = os.environ.get('WARM_UP', '1').lower() in ('1', 'true', 'yes')
+PRELOAD = os.environ.get('PRELOAD', '').lower() in ('1', 'true', 'yes')
+warmed_up = threading.Event()
+
+# Resized thumbnails served by /api/thumbnail, and how long browsers may cache them
+thumbnail_cache = ThumbnailCache(
+    os.environ.get('THUMBNAIL_CACHE_DIR', os.path.join('downloads', '.thumbnails')),
+    max_bytes=int(os.environ.get('THUMBNAIL_CACHE_MAX_BYTES', 200 * 1024 ** 2)),
+    memory_entries=int(os.environ.get('THUMBNAIL_MEMORY_ENTRIES', 256))
+)
+THUMBNAIL_MAX_AGE = int(os.environ.get('THUMBNAIL_MAX_AGE', 7 * 24 * 3600))
+
+# Recently extracted video info, shared by fetch_info and download
+metadata_cache = MetadataCache(max_entries=int(os.environ.get('METADATA_CACHE_SIZE', 256)))
+
+# fetch_info extractions run on their own per-platform pools, so slow ones wait
+# there (up to EXTRACTION_TIMEOUT) instead of piling up on request threads.
+# Each waiting caller holds a request thread, so by default at most half of
+# the worker's WEB_THREADS wait for extractions and the rest stay free.
+MAX_EXTRACTION_WAITERS = int(os.environ.get('MAX_EXTRACTION_WAITERS',
+                                            max(1, int(os.environ.get('WEB_THREADS', 32)) // 2)))
+extraction_executor = ExtractionExecutor({
+    'youtube': int(os.environ.get('MAX_YOUTUBE_EXTRACTIONS', 4)),
+    'instagram': int(os.environ.get('MAX_INSTAGRAM_EXTRACTIONS', 2))
+}, max_queue=int(os.environ.get('MAX_QUEUED_EXTRACTIONS', MAX_EXTRACTION_WAITERS)), max_waiters=MAX_EXTRACTION_WAITERS)
+EXTRACTION_TIMEOUT = float(os.environ.get('EXTRACTION_TIMEOUT', 30))
+
+# Previously downloaded files, reused when the same video and format is requested again
+media_store = MediaStore(
+    os.environ.get('MEDIA_STORE_DIR', os.path.join('downloads', '.media')),
+    max_bytes=int(os.environ.get('MEDIA_STORE_MAX_BYTES', 10 * 1024 ** 3))
+)
+
+# Fixed-size worker pool so bursts of requests queue instead of spawning threads
+scheduler = DownloadScheduler(
+    max_workers=int(os.environ.get('MAX_CONCURRENT_DOWNLOADS', 4)),
+    max_queue=int(os.environ.get('MAX_QUEUED_DOWNLOADS', 50))
+)
+
+# Merges and audio conversions run as ffmpeg processes from their own pool,
+# one per CPU, so they don't hold download slots. 0 runs them inline in yt-dlp.
+POSTPROCESS_WORKERS = int(os.environ.get('POSTPROCESS_WORKERS', os.cpu_count() or 1))
+postprocess_pool = DownloadScheduler(
+    max_workers=POSTPROCESS_WORKERS,
+    max_queue=int(os.environ.get('MAX_QUEUED_POSTPROCESSING', 1000)),
+    name='postprocess-worker'
+)
 
 class VideoDownloader:
     def __init__(self):
         self.video_info = None
         self.instagram_preview = None
-        self.video_formats = []
-        self.audio_formats = []
     
     def progress_hook(self, d, download_id):
         """Progress hook for yt-dlp downloads"""
         try:
             status = d.get('status')
             if status == 'downloading':
-                percent_str = d.get('_percent_str') or f"{d.get('percent', 0):.1f}%"
+                percent_str = d.get('_percent_str') or (f"{d['percent']:.1f}%" if 'percent' in d else '')
                 speed_str = d.get('_speed_str') or self._human_readable(d.get('speed'))
-                eta_str = d.get('_eta_str') or str(d.get('eta')) if d.get('eta') else 'NA'
+                eta_str = d.get('_eta_str') or (str(d['eta']) if d.get('eta') is not None else 'NA')
                 
                 # Extract percentage
                 try:
@@ -43,20 +175,12 @@ class VideoDownloader:
                     downloaded = d.get('downloaded_bytes') or 0
                     percent = (downloaded / total * 100) if total else 0
                 
-                download_progress[download_id] = {
-                    'status': 'downloading',
-                    'percent': percent,
-                    'speed': speed_str,
-                    'eta': eta_str
-                }
+                progress_store.update(download_id, status='downloading', percent=percent, speed=speed_str, eta=eta_str,
+                                      parts=d.get('parts'))
+                job_journal.progress(download_id, d.get('downloaded_bytes') or 0)
             
             elif status == 'finished':
-                download_progress[download_id] = {
-                    'status': 'finalizing',
-                    'percent': 100,
-                    'speed': '',
-                    'eta': 'Finalizing...'
-                }
+                progress_store.update(download_id, status='finalizing', percent=100, speed='', eta='Finalizing...')
         except Exception as e:
             print(f"Progress hook error: {e}")
     
@@ -74,142 +198,24 @@ class VideoDownloader:
             i += 1
         return f"{b:.2f} {units[i]}"
     
-    def fetch_youtube_info(self, url):
-        """Fetch YouTube video information"""
-        try:
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'extract_flat': False,
-                'logger': None,  # Disable logging to avoid the error
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                
-            # Process formats
-            formats = info.get('formats', [])
-            video_formats = []
-            audio_formats = []
-            
-            # Video formats
-            for fmt in formats:
-                if (fmt.get('vcodec') != 'none' and fmt.get('acodec') != 'none' and 
-                    fmt.get('ext') == 'mp4'):
-                    height = fmt.get('height')
-                    if height:
-                        video_formats.append({
-                            'height': height,
-                            'format_id': fmt['format_id'],
-                            'ext': fmt.get('ext', 'mp4'),
-                            'filesize': fmt.get('filesize'),
-                            'quality': f"{height}p",
-                            'has_audio': True
-                        })
-                
-                elif (fmt.get('vcodec') != 'none' and fmt.get('acodec') == 'none' and 
-                      fmt.get('ext') in ['mp4', 'webm']):
-                    height = fmt.get('height')
-                    if height and height >= 240:
-                        video_formats.append({
-                            'height': height,
-                            'format_id': fmt['format_id'],
-                            'ext': fmt.get('ext', 'mp4'),
-                            'filesize': fmt.get('filesize'),
-                            'quality': f"{height}p",
-                            'has_audio': False
-                        })
-                
-                # Audio formats
-                elif (fmt.get('acodec') != 'none' and fmt.get('vcodec') == 'none'):
-                    abr = fmt.get('abr', 0)
-                    ext = fmt.get('ext', '')
-                    if abr and ext in ['m4a', 'mp3', 'aac']:
-                        audio_formats.append({
-                            'abr': abr,
-                            'format_id': fmt['format_id'],
-                            'ext': ext,
-                            'filesize': fmt.get('filesize'),
-                            'quality': f"{int(abr)}kbps"
-                        })
-            
-            # Remove duplicates and sort
-            video_formats = self._remove_duplicate_formats(video_formats)
-            video_formats.sort(key=lambda x: x['height'], reverse=True)
-            audio_formats.sort(key=lambda x: x['abr'], reverse=True)
-            
-            return {
-                'success': True,
-                'title': info.get('title', 'Unknown Title'),
-                'duration': self._format_duration(info.get('duration', 0)),
-                'views': self._format_views(info.get('view_count', 0)),
-                'thumbnail': info.get('thumbnail'),
-                'video_formats': video_formats,
-                'audio_formats': audio_formats,
-                'url': url
-            }
-            
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
+    def _extract_info(self, url, platform='youtube'):
+        """Run a full yt-dlp extraction without downloading"""
+        with ydl_sessions[platform].session({'extract_flat': False}) as ydl:
+            return ydl.extract_info(url, download=False)
     
-    def fetch_instagram_info(self, url):
-        """Fetch Instagram video information"""
-        try:
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'extract_flat': False,
-                'logger': None,  # Disable logging to avoid the error
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-            
-            return {
-                'success': True,
-                'title': info.get('title', 'Instagram Reel'),
-                'uploader': info.get('uploader', 'Unknown User'),
-                'thumbnail': info.get('thumbnail'),
-                'url': url
-            }
-            
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
-    
-    def _remove_duplicate_formats(self, formats):
-        """Remove duplicate formats with same height"""
-        seen = {}
-        for fmt in formats:
-            height = fmt['height']
-            if height not in seen:
-                seen[height] = fmt
-            elif fmt.get('has_audio', False) and not seen[height].get('has_audio', False):
-                seen[height] = fmt
-        return list(seen.values())
-    
-    def _format_duration(self, seconds):
-        if not seconds:
-            return "Unknown"
+    def fetch_video_info(self, url, platform):
+        """Extract a video's info and cache it; returns the metadata cache entry
         
-        hours = seconds // 3600
-        minutes = (seconds % 3600) // 60
-        seconds = seconds % 60
-        
-        if hours > 0:
-            return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+        Callers check the cache first. Extraction errors are raised.
+        """
+        info = self._extract_info(url, platform)
+        if platform == 'youtube':
+            formats = FormatIndex(info.get('formats') or [])
+            entry = {'info': info, 'result': youtube_summary(info, url, formats), 'formats': formats}
         else:
-            return f"{minutes:02d}:{seconds:02d}"
-    
-    def _format_views(self, views):
-        if not views:
-            return "Unknown"
-        
-        if views >= 1_000_000:
-            return f"{views/1_000_000:.1f}M"
-        elif views >= 1_000:
-            return f"{views/1_000:.1f}K"
-        else:
-            return str(views)
+            entry = {'info': info, 'result': instagram_summary(info, url)}
+        metadata_cache.put(url, platform, entry)
+        return entry
 
 # Initialize downloader
 downloader = VideoDownloader()
@@ -224,17 +230,68 @@ def fetch_info():
     url = data.get('url', '').strip()
     platform = data.get('platform', 'youtube')
     
-    if not url:
-        return jsonify({'success': False, 'error': 'URL is required'})
+    if platform not in PLATFORMS:
+        return jsonify({'success': False, 'error': f'Unsupported platform: {platform}'})
+    error = validate_url(url, platform)
+    if error:
+        return jsonify({'success': False, 'error': error})
+    
+    try:
+        entry = fetch_metadata(url, platform)
+    except QueueFullError as e:
+        return queue_full_response(e)
+    except ExtractionTimeout:
+        return jsonify({'success': False, 'error': 'Fetching video info timed out, please try again'}), 504
+    except ExtractionCancelled as e:
+        return jsonify({'success': False, 'error': str(e)}), 499
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+    # A shared extraction may have been started for another URL of the same video
+    result = dict(entry['result'], url=url)
+    
+    video_id = normalize_video_id(url, platform)
+    if result.get('success') and result.get('thumbnail') and video_id:
+        result = dict(result, thumbnail_proxy=f"/api/thumbnail/{video_id}?platform={platform}")
+    return jsonify(result)
+
+def fetch_metadata(url, platform):
+    """Return the metadata cache entry for a URL, extracting the info on a miss
     
+    Extractions run on the extraction executor and are shared by identical
+    requests. Raises QueueFullError, ExtractionTimeout, ExtractionCancelled
+    or the extraction's own error.
+    """
+    cached = metadata_cache.get(url, platform)
+    if cached:
+        return cached
+    return extraction_executor.run(platform, cache_key(url, platform), lambda: downloader.fetch_video_info(url, platform),
+                                   timeout=EXTRACTION_TIMEOUT, abandoned=client_disconnected)
+
+def client_disconnected():
+    """Whether the client of the current request has closed its connection
+    
+    Only meaningful once the request body has been read: a closed socket
+    then polls readable with nothing left to receive.
+    """
+    sock = request.environ.get('gunicorn.socket') or request.environ.get('werkzeug.socket')
+    if sock is None:
+        return False
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        return bool(readable) and sock.recv(1, socket.MSG_PEEK) == b''
+    except (OSError, ValueError):
+        return False
+
+def validate_url(url, platform):
+    """Return an error message if the URL doesn't belong to the platform"""
+    if not url:
+        return 'URL is required'
     if platform == 'youtube':
         if 'youtube.com' not in url and 'youtu.be' not in url:
-            return jsonify({'success': False, 'error': 'Invalid YouTube URL'})
-        return jsonify(downloader.fetch_youtube_info(url))
-    else:
-        if 'instagram.com' not in url:
-            return jsonify({'success': False, 'error': 'Invalid Instagram URL'})
-        return jsonify(downloader.fetch_instagram_info(url))
+            return 'Invalid YouTube URL'
+    elif 'instagram.com' not in url:
+        return 'Invalid Instagram URL'
+    return None
 
 @app.route('/api/download', methods=['POST'])
 def download_video():
@@ -243,120 +300,834 @@ def download_video():
     platform = data.get('platform', 'youtube')
     quality = data.get('quality')
     format_type = data.get('format_type', 'video')
+    audio_format = data.get('audio_format', 'mp3')
     download_path = data.get('download_path', './downloads')
     
     if not url or not quality:
         return jsonify({'success': False, 'error': 'URL and quality are required'})
+    if platform not in PLATFORMS:
+        return jsonify({'success': False, 'error': f'Unsupported platform: {platform}'})
+    error = validate_url(url, platform)
+    if error:
+        return jsonify({'success': False, 'error': error})
+    if audio_format not in AUDIO_FORMATS:
+        return jsonify({'success': False, 'error': f'Invalid audio format: {audio_format}'})
+    
+    try:
+        job = start_download(url, platform, quality, format_type, download_path, audio_format=audio_format)
+    except ValueError:
+        return jsonify({'success': False, 'error': f'Invalid quality: {quality}'})
+    except QueueFullError as e:
+        return queue_full_response(e)
+    
+    return jsonify(dict(job, success=True))
+
+def queue_full_response(error):
+    response = jsonify({'success': False, 'error': f'{error}, please try again later'})
+    response.headers['Retry-After'] = '30'
+    return response, 429
+
+def start_download(url, platform, quality, format_type, download_path, priority=0, max_queue=None,
+                   download_id=None, format_id=None, audio_format='mp3'):
+    """Create a download job and queue it on the worker pool
+    
+    Returns a dict with the job's download_id and queue position, or the ID of
+    an identical job already in progress. Raises ValueError for an invalid
+    quality and QueueFullError when the queue has no room. A resumed job
+    passes its original download_id and the format_id it had resolved to.
+    """
+    # Reuse the info extracted by fetch_info so the download skips a second extraction
+    cached = metadata_cache.get(url, platform) or {}
+    info = cached.get('info')
+    
+    options = format_options(platform, quality, format_type, cached.get('formats'), audio_format)
+    if format_id:
+        # Keep the stream the partial files belong to
+        options = dict(options, format=f"{format_id}/{options['format']}")
     
     # Create download directory
     os.makedirs(download_path, exist_ok=True)
     
     # Generate unique download ID
-    download_id = str(uuid.uuid4())
+    resuming = download_id is not None
+    download_id = download_id or str(uuid.uuid4())
     
     def download_thread():
         try:
-            download_progress[download_id] = {
-                'status': 'starting',
-                'percent': 0,
-                'speed': '',
-                'eta': 'Starting...'
-            }
+            progress_store.update(download_id, status='starting', percent=0, speed='', eta='Starting...')
             
             if platform == 'youtube':
-                download_youtube(url, quality, format_type, download_path, download_id)
+                result = download_youtube(url, options, download_path, download_id, info)
             else:
-                download_instagram(url, download_path, download_id)
-                
-            download_progress[download_id] = {
-                'status': 'completed',
-                'percent': 100,
-                'speed': '',
-                'eta': 'Completed!'
-            }
+                result = download_instagram(url, options, download_path, download_id, info)
             
+            if isinstance(result, PostprocessTask) and result.copy:
+                # Stream copies are quick and I/O bound, so don't queue them behind transcodes
+                result = run_postprocess(result, download_id)
+            elif isinstance(result, PostprocessTask):
+                # Hand the ffmpeg work to the postprocessing pool and free this download slot
+                progress_store.update(download_id, status='processing', percent=0, speed='',
+                                      eta='Waiting to process...')
+                try:
+                    postprocess_pool.submit(download_id, lambda: postprocess_thread(result))
+                    return
+                except QueueFullError:
+                    result = run_postprocess(result, download_id)
+            
+            finish_job(result)
+        except Exception as e:
+            finish_job(error=e)
+    
+    def postprocess_thread(task):
+        try:
+            finish_job(run_postprocess(task, download_id))
         except Exception as e:
-            download_progress[download_id] = {
-                'status': 'error',
-                'percent': 0,
-                'speed': '',
-                'eta': f'Error: {str(e)}'
-            }
+            finish_job(error=e)
     
-    # Start download in background
-    thread = threading.Thread(target=download_thread, daemon=True)
-    thread.start()
+    def finish_job(filepath=None, error=None):
+        if error is None:
+            progress_store.update(download_id, status='completed', percent=100, speed='', eta='Completed!',
+                                  filepath=filepath and os.path.abspath(filepath))
+        else:
+            progress_store.update(download_id, status='error', percent=0, speed='', eta=f'Error: {str(error)}')
+        progress_store.release(key, download_id)
+        job_journal.remove(download_id)
+    
+    # Queue download for the worker pool
+    progress_store.update(download_id, status='queued', percent=0, speed='', eta='Queued')
+    
+    # Attach to an identical download that is already queued or running
+    key = dedup_key(platform, url, options, download_path)
+    owner = progress_store.claim(key, download_id)
+    if owner != download_id:
+        progress_store.remove(download_id)
+        job_journal.remove(download_id)
+        return {'download_id': owner, 'deduplicated': True}
+    
+    job_journal.add(download_id, {
+        'url': url,
+        'platform': platform,
+        'quality': quality,
+        'format_type': format_type,
+        'audio_format': audio_format,
+        'download_path': download_path,
+        'priority': priority,
+        'max_queue': max_queue
+    })
+    try:
+        position = scheduler.submit(download_id, download_thread, priority=priority, max_queue=max_queue)
+    except QueueFullError:
+        progress_store.release(key, download_id)
+        progress_store.remove(download_id)
+        if resuming:
+            # Leave it in the journal to be picked up again later
+            job_journal.release(download_id)
+        else:
+            job_journal.remove(download_id)
+        raise
     
-    return jsonify({'success': True, 'download_id': download_id})
+    return {'download_id': download_id, 'queue_position': position}
+
+@app.route('/api/batch', methods=['POST'])
+def batch_download():
+    """Queue every video of a list of URLs and/or playlists as one batch"""
+    import yt_dlp
+    data = request.json
+    urls = data.get('urls') or ([data['url']] if data.get('url') else [])
+    platform = data.get('platform', 'youtube')
+    quality = data.get('quality', 'best')
+    format_type = data.get('format_type', 'video')
+    audio_format = data.get('audio_format', 'mp3')
+    download_path = data.get('download_path', './downloads')
+    
+    if platform not in PLATFORMS:
+        return jsonify({'success': False, 'error': f'Unsupported platform: {platform}'})
+    urls = [url.strip() for url in urls if url and url.strip()]
+    if not urls:
+        return jsonify({'success': False, 'error': 'At least one URL is required'})
+    if audio_format not in AUDIO_FORMATS:
+        return jsonify({'success': False, 'error': f'Invalid audio format: {audio_format}'})
+    try:
+        format_options(platform, quality, format_type)
+    except ValueError:
+        return jsonify({'success': False, 'error': f'Invalid quality: {quality}'})
+    for url in urls:
+        error = validate_url(url, platform)
+        if error:
+            return jsonify({'success': False, 'error': f'{error}: {url}'})
+    
+    try:
+        item_urls = expand_playlists(urls, platform)
+    except yt_dlp.utils.YoutubeDLError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    if not item_urls:
+        return jsonify({'success': False, 'error': 'No videos found'})
+    if len(item_urls) > MAX_BATCH_ITEMS:
+        return jsonify({'success': False, 'error': f'Batches are limited to {MAX_BATCH_ITEMS} videos'})
+    
+    # Admit the whole batch or none of it
+    if scheduler.free_slots(BATCH_PRIORITY, MAX_QUEUED_BATCH_ITEMS) < len(item_urls):
+        return queue_full_response(QueueFullError('Batch queue is full'))
+    
+    items = []
+    for url in item_urls:
+        try:
+            job = start_download(url, platform, quality, format_type, download_path,
+                                 priority=BATCH_PRIORITY, max_queue=MAX_QUEUED_BATCH_ITEMS,
+                                 audio_format=audio_format)
+        except QueueFullError:
+            # Lost a race for the last slots; report the item as failed
+            job = {'download_id': str(uuid.uuid4())}
+            progress_store.update(job['download_id'], status='error', percent=0, speed='',
+                                  eta='Error: Download queue is full')
+        items.append((job['download_id'], url))
+    
+    batch_id = str(uuid.uuid4())
+    progress_store.add_batch(batch_id, items)
+    
+    return jsonify({
+        'success': True,
+        'batch_id': batch_id,
+        'items': [{'download_id': download_id, 'url': url} for download_id, url in items]
+    })
+
+@app.route('/api/batch/<batch_id>')
+def get_batch(batch_id):
+    """Per-item and aggregate progress of a batch"""
+    items = progress_store.get_batch(batch_id)
+    if items is None:
+        return jsonify({'success': False, 'status': 'unknown', 'error': 'Unknown batch'}), 404
+    
+    results = []
+    counts = {}
+    total_percent = 0
+    for download_id, url in items:
+        progress = current_progress(download_id)
+        results.append(dict(progress, download_id=download_id, url=url))
+        counts[progress['status']] = counts.get(progress['status'], 0) + 1
+        total_percent += progress.get('percent') or 0
+    
+    finished = counts.get('completed', 0) + counts.get('error', 0) + counts.get('unknown', 0)
+    if finished < len(items):
+        status = 'downloading' if len(items) - finished > counts.get('queued', 0) else 'queued'
+    elif counts.get('completed', 0) == len(items):
+        status = 'completed'
+    else:
+        status = 'completed_with_errors'
+    
+    return jsonify({
+        'success': True,
+        'batch_id': batch_id,
+        'status': status,
+        'total': len(items),
+        'completed': counts.get('completed', 0),
+        'failed': counts.get('error', 0) + counts.get('unknown', 0),
+        'running': len(items) - finished - counts.get('queued', 0),
+        'queued': counts.get('queued', 0),
+        'percent': round(total_percent / len(items), 1),
+        'items': results
+    })
+
+def expand_playlists(urls, platform='youtube'):
+    """Replace playlist URLs with the URLs of their videos, using flat extraction"""
+    item_urls = []
+    with ydl_sessions[platform].session({'extract_flat': 'in_playlist'}) as ydl:
+        for url in urls:
+            if 'list=' not in url and '/playlist' not in url:
+                item_urls.append(url)
+                continue
+            
+            # Flat extraction lists entries without resolving each video
+            info = ydl.extract_info(url, download=False)
+            for entry in info.get('entries') or []:
+                entry_url = entry.get('url') or entry.get('webpage_url')
+                if not entry_url and entry.get('id'):
+                    entry_url = f"https://www.youtube.com/watch?v={entry['id']}"
+                if entry_url:
+                    item_urls.append(entry_url)
+    return item_urls
 
 @app.route('/api/progress/<download_id>')
 def get_progress(download_id):
-    progress = download_progress.get(download_id, {
+    return jsonify(current_progress(download_id))
+
+@app.route('/api/progress/<download_id>/stream')
+def stream_progress(download_id):
+    """Push progress updates as Server-Sent Events until the download ends
+    
+    Each stream is closed after PROGRESS_STREAM_DURATION seconds; the
+    browser's EventSource reconnects after the advertised retry delay.
+    """
+    if not progress_stream_slots.acquire(blocking=False):
+        response = jsonify({'success': False, 'error': 'Too many progress streams, poll /api/progress instead'})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    min_interval = 1.0 / PROGRESS_STREAM_MAX_RATE
+    deadline = time.monotonic() + PROGRESS_STREAM_DURATION
+    
+    def generate():
+        yield 'retry: 2000\n\n'
+        version = -1
+        last_sent = None
+        while True:
+            # Queue positions are computed on read, so refresh queued jobs periodically
+            queued = last_sent is not None and last_sent['status'] == 'queued'
+            remaining = max(0, deadline - time.monotonic())
+            version = progress_store.wait_for_change(download_id, version, timeout=min(1 if queued else 15, remaining))
+            
+            progress = current_progress(download_id)
+            if progress != last_sent:
+                yield f"data: {json.dumps(progress)}\n\n"
+                last_sent = progress
+            else:
+                yield ': keep-alive\n\n'
+            
+            if progress['status'] in ('completed', 'error', 'unknown') or time.monotonic() >= deadline:
+                return
+            
+            # Coalesce bursts of updates into at most one event per interval
+            time.sleep(min_interval)
+    
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Runs when the server closes the response, even if the stream never started
+    response.call_on_close(progress_stream_slots.release)
+    return response
+
+def current_progress(download_id):
+    """Return the progress record for a download, including its live queue position"""
+    progress = progress_store.get(download_id) or {
         'status': 'unknown',
         'percent': 0,
         'speed': '',
         'eta': 'Unknown'
+    }
+    if progress.get('status') == 'queued':
+        position = scheduler.position(download_id)
+        if position:
+            progress.update(queue_position=position, eta=f'Queued (position {position})')
+    return progress
+
+@app.route('/api/file/<download_id>')
+def get_file(download_id):
+    """Send a finished download to the browser
+    
+    Range/If-Range, ETag and Last-Modified are handled by Werkzeug's conditional
+    responses, and the file is streamed through wsgi.file_wrapper so servers
+    that support it use sendfile instead of reading it into memory.
+    """
+    filepath = progress_store.get_file(download_id)
+    if not filepath or not os.path.isfile(filepath):
+        return jsonify({'success': False, 'error': 'File not available'}), 404
+    
+    return send_from_directory(
+        os.path.dirname(filepath),
+        os.path.basename(filepath),
+        as_attachment=True,
+        conditional=True,
+        etag=True,
+        max_age=0
+    )
+
+@app.route('/api/stream')
+def stream_video():
+    """Relay a progressive format to the client while it is being fetched
+    
+    Only formats that need no muxing or transcoding can be streamed. Chunks are
+    read from the origin only as fast as the client consumes them, so at most
+    one chunk is buffered per stream.
+    """
+    import requests
+    import yt_dlp
+    url = request.args.get('url', '').strip()
+    platform = request.args.get('platform', 'youtube')
+    quality = request.args.get('quality', 'best')
+    
+    if platform not in PLATFORMS:
+        return jsonify({'success': False, 'error': f'Unsupported platform: {platform}'}), 400
+    error = validate_url(url, platform)
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    
+    try:
+        cached = fetch_metadata(url, platform)
+    except QueueFullError as e:
+        return queue_full_response(e)
+    except ExtractionTimeout:
+        return jsonify({'success': False, 'error': 'Fetching video info timed out, please try again'}), 504
+    except ExtractionCancelled as e:
+        return jsonify({'success': False, 'error': str(e)}), 499
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 502
+    info = cached['info']
+    
+    try:
+        fmt = resolve_stream_format(info, platform, quality, cached.get('formats'))
+    except (ValueError, yt_dlp.utils.YoutubeDLError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if fmt is None:
+        return jsonify({'success': False, 'error': 'This quality needs merging, use /api/download instead'}), 409
+    
+    filename = f"{secure_filename(info.get('title') or '') or info.get('id') or 'video'}.{fmt.get('ext', 'mp4')}"
+    key = media_key(platform, info.get('id'), fmt.get('format_id'))
+    
+    # Already downloaded before: serve the stored copy
+    stored = media_store.get(key)
+    if stored:
+        return send_from_directory(os.path.dirname(stored), os.path.basename(stored), as_attachment=True,
+                                   download_name=filename, conditional=True, max_age=0)
+    
+    headers = dict(fmt.get('http_headers') or {})
+    client_range = request.headers.get('Range')
+    if client_range:
+        headers['Range'] = client_range
+    
+    try:
+        upstream = requests.get(fmt['url'], headers=headers, stream=True, timeout=(10, 60))
+    except requests.RequestException as e:
+        return jsonify({'success': False, 'error': f'Could not reach origin: {e}'}), 502
+    if upstream.status_code not in (200, 206):
+        upstream.close()
+        return jsonify({'success': False, 'error': f'Origin returned HTTP {upstream.status_code}'}), 502
+    
+    # Tee complete (non-range) transfers into the media store
+    tee_path = None
+    if STREAM_TO_CACHE and upstream.status_code == 200:
+        tee_path = os.path.join(media_store.root, f".{uuid.uuid4().hex}.part")
+    
+    def relay():
+        tee = open(tee_path, 'wb') if tee_path else None
+        complete = False
+        try:
+            for chunk in upstream.iter_content(STREAM_CHUNK_SIZE):
+                if tee:
+                    tee.write(chunk)
+                yield chunk
+            complete = True
+        finally:
+            upstream.close()
+            if tee:
+                tee.close()
+                expected = upstream.headers.get('Content-Length')
+                if complete and (not expected or os.path.getsize(tee_path) == int(expected)):
+                    media_store.add(key, tee_path, ext=fmt.get('ext'))
+                os.remove(tee_path)
+    
+    response = Response(relay(), status=upstream.status_code,
+                        mimetype=upstream.headers.get('Content-Type', 'application/octet-stream'))
+    for header in ('Content-Length', 'Content-Range', 'Accept-Ranges'):
+        if header in upstream.headers:
+            response.headers[header] = upstream.headers[header]
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def resolve_stream_format(info, platform, quality, index=None):
+    """Pick a single progressive HTTP format for streaming, or None if muxing is needed"""
+    import yt_dlp
+    if platform == 'youtube' and quality != 'best':
+        height = int(quality.split('p')[0])
+        selector = f"best[height<={height}][vcodec!=none][acodec!=none][protocol^=http]"
+        progressive = index.get(height, True) if index else None
+        if progressive:
+            selector = f"{progressive.format_id}[protocol^=http]/{selector}"
+    else:
+        selector = 'best[ext=mp4][protocol^=http]/best[protocol^=http]'
+    
+    with ydl_sessions[platform].session({'format': selector}) as ydl:
+        try:
+            resolved = ydl.process_ie_result(copy.deepcopy(info), download=False)
+        except yt_dlp.utils.ExtractorError:
+            return None
+    if resolved.get('requested_formats') or not resolved.get('url'):
+        return None
+    return resolved
+
+@app.route('/api/thumbnail/<video_id>')
+def get_thumbnail(video_id):
+    """Serve a video's thumbnail resized to a standard width (?w=), from the thumbnail cache"""
+    import requests
+    platform = request.args.get('platform', 'youtube')
+    if platform not in ('youtube', 'instagram') or not THUMBNAIL_ID_RE.fullmatch(video_id):
+        return jsonify({'success': False, 'error': 'Invalid video ID'}), 400
+    width = snap_width(request.args.get('w', 480, type=int))
+    
+    # The origin URL is only needed on a miss; cached variants are served even
+    # once the video's info has left this process's metadata cache
+    try:
+        thumbnail = thumbnail_cache.get(f"{platform}:{video_id}", width, lambda: thumbnail_origin(platform, video_id))
+    except (requests.RequestException, OSError) as e:
+        return jsonify({'success': False, 'error': f'Could not load thumbnail: {e}'}), 502
+    if thumbnail is None:
+        return jsonify({'success': False, 'error': 'Unknown thumbnail, fetch the video info first'}), 404
+    filename, data = thumbnail
+    
+    response = Response(data, mimetype='image/jpeg')
+    response.set_etag(filename)
+    response.cache_control.public = True
+    response.cache_control.max_age = THUMBNAIL_MAX_AGE
+    return response.make_conditional(request)
+
+def thumbnail_origin(platform, video_id):
+    """Return the original thumbnail URL of a video, or None if it isn't known"""
+    if platform == 'youtube':
+        url = f"https://www.youtube.com/watch?v={video_id}"
+    else:
+        url = f"https://www.instagram.com/reel/{video_id}/"
+    cached = metadata_cache.get(url, platform)
+    if cached and cached['info'].get('thumbnail'):
+        return cached['info']['thumbnail']
+    if platform == 'youtube':
+        return f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg"
+    return None
+
+@app.route('/api/stats')
+def get_stats():
+    return jsonify({
+        'metadata_cache': metadata_cache.stats(),
+        'extraction': extraction_executor.stats(),
+        'scheduler': scheduler.stats(),
+        'postprocess_pool': postprocess_pool.stats(),
+        'progress_store': progress_store.stats(),
+        'media_store': media_store.stats(),
+        'thumbnail_cache': thumbnail_cache.stats(),
+        'ydl_sessions': {platform: pool.stats() for platform, pool in ydl_sessions.items()},
+        'warmed_up': warmed_up.is_set(),
+        'job_journal': job_journal.stats()
     })
-    return jsonify(progress)
 
-def download_youtube(url, quality, format_type, download_path, download_id):
-    """Download YouTube video"""
-    prefer_aac_audio = "bestaudio[ext=m4a]/bestaudio[ext=aac]/bestaudio"
+def run_ydl(ydl_opts, url, platform, info=None, job_id=None):
+    """Download a URL and return the final file path
+    
+    Starts from previously extracted info when available and serves the file
+    from the media store if the same video and format was downloaded before.
+    The resolved format and output path are recorded in the job journal.
+    When a merge or audio conversion is needed and the postprocessing pool
+    is enabled, only the streams are downloaded and a PostprocessTask is
+    returned for the caller to queue.
+    """
+    import yt_dlp
+    finished = []
+    ydl_opts = dict(ydl_opts, post_hooks=[finished.append])
+    postprocessing = {k: ydl_opts[k] for k in ('merge_output_format', 'postprocessors') if k in ydl_opts}
+    cached = info is not None
+    
+    with ydl_sessions[platform].session(ydl_opts) as ydl:
+        if info is None:
+            info = ydl.extract_info(url, download=False)
+        
+        # Resolve the exact format(s) yt-dlp would download, without touching the network
+        resolved = ydl.process_ie_result(copy.deepcopy(info), download=False)
+        if not resolved.get('requested_formats'):
+            # Nothing to merge, so the merge container doesn't affect the file
+            postprocessing.pop('merge_output_format', None)
+        key = media_key(platform, resolved.get('id'), resolved.get('format_id'), postprocessing)
+        if job_id:
+            job_journal.update(job_id, format_id=resolved.get('format_id'),
+                               filepath=os.path.abspath(ydl.prepare_filename(resolved)))
+        stored = media_store.get(key)
+        if stored:
+            filename = os.path.splitext(ydl.prepare_filename(resolved))[0] + os.path.splitext(stored)[1]
+            return media_store.materialize(stored, os.path.abspath(filename))
+        
+        if PARALLEL_STREAMS and resolved.get('requested_formats'):
+            prefetch_parallel(ydl, resolved, ydl_opts.get('progress_hooks', []))
+        elif SEGMENTED_DOWNLOADS and not resolved.get('requested_formats'):
+            prefetch_segmented(ydl, resolved, ydl_opts.get('progress_hooks', []))
+        
+        task = postprocess_task(ydl, resolved, ydl_opts, key)
+        if task:
+            # Only the network transfer happens here; the caller queues the ffmpeg work
+            try:
+                download_streams(ydl, resolved)
+            except yt_dlp.utils.DownloadError:
+                if not cached:
+                    raise
+                resolved = ydl.process_ie_result(ydl.extract_info(url, download=False), download=False)
+                download_streams(ydl, resolved)
+            return task
+        
+        try:
+            ydl.process_ie_result(copy.deepcopy(info), download=True)
+        except yt_dlp.utils.DownloadError:
+            if not cached:
+                raise
+            # Cached stream URLs may have expired; fall back to a fresh extraction
+            ydl.download([url])
+    
+    if not finished:
+        return None
+    media_store.add(key, finished[-1])
+    return finished[-1]
+
+def stream_paths(ydl, resolved):
+    """Return (path, format) for each stream of a resolved format, named as yt-dlp names them"""
+    filename = ydl.prepare_filename(resolved)
+    if not resolved.get('requested_formats'):
+        return [(filename, resolved)]
+    base = os.path.splitext(filename)[0]
+    return [(f"{base}.f{fmt['format_id']}.{fmt['ext']}", fmt) for fmt in resolved['requested_formats']]
+
+def download_streams(ydl, resolved):
+    """Download each stream of a resolved format with yt-dlp's downloaders, skipping postprocessing"""
+    import yt_dlp
+    for path, fmt in stream_paths(ydl, resolved):
+        if os.path.exists(path):
+            continue
+        stream = dict(resolved, **fmt)
+        stream.pop('requested_formats', None)
+        success, _ = ydl.dl(path, stream)
+        if not success:
+            raise yt_dlp.utils.DownloadError(f"Failed to download format {fmt.get('format_id')}")
+
+def postprocess_task(ydl, resolved, ydl_opts, key):
+    """Describe the ffmpeg work a download needs, or None to leave it to yt-dlp
+    
+    Only merges and FFmpegExtractAudio are taken over, and only when the
+    postprocessing pool is enabled and ffmpeg is installed.
+    """
+    if not POSTPROCESS_WORKERS or not ffmpeg_available():
+        return None
+    postprocessors = ydl_opts.get('postprocessors', [])
+    duration = resolved.get('duration')
+    streams = stream_paths(ydl, resolved)
+    inputs = []
+    for path, fmt in streams:
+        vcodec = fmt.get('vcodec') if fmt.get('vcodec') != 'none' else None
+        acodec = fmt.get('acodec') if fmt.get('acodec') != 'none' else None
+        inputs.append((path, vcodec, acodec))
+    
+    if resolved.get('requested_formats') and not postprocessors:
+        return PostprocessTask('merge', inputs, os.path.abspath(ydl.prepare_filename(resolved)),
+                               duration=duration, key=key)
+    
+    if len(postprocessors) == 1 and postprocessors[0].get('key') == 'FFmpegExtractAudio' and len(inputs) == 1:
+        codec = postprocessors[0].get('preferredcodec', 'mp3')
+        if codec not in AUDIO_CODECS:
+            return None
+        base = os.path.splitext(ydl.prepare_filename(resolved))[0]
+        return PostprocessTask('extract_audio', inputs, os.path.abspath(f"{base}.{AUDIO_CODECS[codec][0]}"),
+                               duration=duration, codec=codec,
+                               quality=postprocessors[0].get('preferredquality'), key=key)
+    return None
+
+def run_postprocess(task, download_id):
+    """Run a PostprocessTask, reporting its progress, and add the result to the media store"""
+    if task.kind == 'merge':
+        label = 'Merging...'
+    else:
+        label = 'Copying audio...' if task.copy else 'Converting audio...'
+    progress_store.update(download_id, status='processing', percent=0, speed='', eta=label)
+    
+    def report(percent):
+        progress_store.update(download_id, status='processing', percent=percent, speed='', eta=label)
     
+    filepath = task.run(progress_callback=report)
+    if task.key:
+        media_store.add(task.key, filepath)
+    return filepath
+
+def prefetch_segmented(ydl, resolved, progress_hooks):
+    """Fetch a single-stream format over several connections before yt-dlp runs
+    
+    The file is written to the path yt-dlp would download to, so yt-dlp treats
+    it as already downloaded and only runs postprocessing. Servers without
+    range support are left to yt-dlp's normal single-connection download.
+    """
+    from segmented_download import segmented_download, RangeNotSupported
+    if resolved.get('protocol') not in ('http', 'https') or not resolved.get('url'):
+        return
+    size = resolved.get('filesize')
+    if (size or resolved.get('filesize_approx') or 0) < SEGMENTED_MIN_SIZE:
+        return
+    path = ydl.prepare_filename(resolved)
+    if os.path.exists(path):
+        return
+    
+    def report(d):
+        for hook in progress_hooks:
+            hook(d)
+    
+    try:
+        segmented_download(resolved['url'], path, headers=resolved.get('http_headers'), size=size,
+                           connections=SEGMENT_CONNECTIONS, progress_callback=report)
+    except RangeNotSupported:
+        return
+
+def prefetch_parallel(ydl, resolved, progress_hooks):
+    """Fetch the streams of a video+audio merge concurrently before yt-dlp runs
+    
+    Each stream is written to the '<name>.f<format_id>.<ext>' file yt-dlp
+    would download it to, so yt-dlp skips both downloads and goes straight
+    to merging. Progress of the streams is reported per part and combined
+    into one percentage. Streams that can't be fetched by range are left to
+    yt-dlp's normal sequential download.
+    """
+    from segmented_download import segmented_download, RangeNotSupported
+    formats = resolved['requested_formats']
+    if any(f.get('protocol') not in ('http', 'https') or not f.get('url') for f in formats):
+        return
+    if os.path.exists(ydl.prepare_filename(resolved)):
+        return
+    paths = [path for path, _ in stream_paths(ydl, resolved)]
+    
+    names = ['video' if f.get('vcodec') not in (None, 'none') else 'audio' for f in formats]
+    if len(set(names)) != len(names):
+        names = [f['format_id'] for f in formats]
+    # [downloaded, total, speed] per stream; totals start from yt-dlp's estimates
+    state = [[0, f.get('filesize') or f.get('filesize_approx') or 0, 0] for f in formats]
+    lock = threading.Lock()
+    
+    def report(i, d):
+        with lock:
+            state[i] = [d['downloaded_bytes'], d['total_bytes'], d.get('speed') or 0]
+            downloaded = sum(s[0] for s in state)
+            total = sum(s[1] for s in state)
+            speed = sum(s[2] for s in state)
+            parts = {name: round(s[0] / s[1] * 100, 1) if s[1] else 0 for name, s in zip(names, state)}
+        eta = (total - downloaded) / speed if speed else None
+        combined = {
+            'status': 'downloading',
+            'downloaded_bytes': downloaded,
+            'total_bytes': total,
+            'speed': speed,
+            'eta': int(eta) if eta is not None else None,
+            'parts': parts
+        }
+        for hook in progress_hooks:
+            hook(combined)
+    
+    def fetch(i, fmt):
+        path = paths[i]
+        if os.path.exists(path):
+            return
+        size = fmt.get('filesize')
+        large = (size or fmt.get('filesize_approx') or 0) >= SEGMENTED_MIN_SIZE
+        segmented_download(fmt['url'], path, headers=fmt.get('http_headers'), size=size,
+                           connections=SEGMENT_CONNECTIONS if SEGMENTED_DOWNLOADS and large else 1,
+                           progress_callback=lambda d: report(i, d))
+    
+    with ThreadPoolExecutor(max_workers=len(formats)) as pool:
+        futures = [pool.submit(fetch, i, fmt) for i, fmt in enumerate(formats)]
+    for future in futures:
+        try:
+            future.result()
+        except RangeNotSupported:
+            pass
+
+def dedup_key(platform, url, options, download_path):
+    """Key identifying downloads that would produce the same output file"""
+    video_id = normalize_video_id(url, platform) or url.strip()
+    return json.dumps([platform, video_id, options, os.path.abspath(download_path)], sort_keys=True)
+
+def download_youtube(url, options, download_path, download_id, info=None):
+    """Download YouTube video"""
     ydl_opts = {
         'outtmpl': os.path.join(download_path, '%(title)s.%(ext)s'),
         'quiet': True,
         'noprogress': True,
         'progress_hooks': [lambda d: downloader.progress_hook(d, download_id)],
     }
+    ydl_opts.update(options)
     
-    if format_type == "video":
-        # Parse quality (e.g., "720p (with audio)" or "720p (video only)")
-        height = int(quality.split('p')[0])
-        
-        # Find matching format
-        video_format = None
-        for fmt in downloader.video_formats:
-            if fmt['height'] == height:
-                video_format = fmt
-                break
-        
-        if video_format and video_format.get('has_audio'):
-            ydl_opts['format'] = video_format['format_id']
-        else:
-            ydl_opts['format'] = f"best[height<={height}]+{prefer_aac_audio}/best"
-        
-        ydl_opts['merge_output_format'] = 'mp4'
-    else:
-        # Audio only
-        ydl_opts['format'] = prefer_aac_audio
-        ydl_opts['postprocessors'] = [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '192',
-        }]
-    
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        ydl.download([url])
-
-def download_instagram(url, download_path, download_id):
+    return run_ydl(ydl_opts, url, 'youtube', info, job_id=download_id)
+
+def download_instagram(url, options, download_path, download_id, info=None):
     """Download Instagram reel"""
     ydl_opts = {
         'outtmpl': os.path.join(download_path, '%(uploader)s_%(title)s.%(ext)s'),
-        'format': 'best[ext=mp4]/best',
-        'http_headers': {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        },
         'quiet': True,
         'noprogress': True,
         'progress_hooks': [lambda d: downloader.progress_hook(d, download_id)]
     }
+    ydl_opts.update(options)
+    
+    return run_ydl(ydl_opts, url, 'instagram', info, job_id=download_id)
+
+def resume_job(job):
+    """Queue a journaled job again after the process that ran it stopped
     
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        ydl.download([url])
+    Its partial files are still on disk, so the download picks up where it
+    left off instead of starting over.
+    """
+    request = job['request']
+    try:
+        start_download(request['url'], request['platform'], request['quality'], request['format_type'],
+                       request['download_path'], priority=request.get('priority', 0),
+                       max_queue=request.get('max_queue'), download_id=job['job_id'],
+                       format_id=job['format_id'], audio_format=request.get('audio_format', 'mp3'))
+        print(f"Resumed download {job['job_id']} ({job['downloaded_bytes']} bytes already fetched)")
+    except QueueFullError:
+        pass  # released back to the journal and tried again on its next pass
+    except Exception as e:
+        print(f"Could not resume download {job['job_id']}: {e}")
+        job_journal.remove(job['job_id'])
+
+def drain(timeout=None, heartbeat=None):
+    """Stop taking downloads and let the ones in progress finish, for a graceful shutdown
+    
+    Queued downloads are handed back to the job journal, so another process
+    sharing it resumes them. Downloaded jobs still get postprocessed here.
+    `heartbeat` is called about once a second while waiting. Returns False
+    if jobs were still running after `timeout` seconds; the journal keeps
+    those too and they are resumed from their partial files.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    job_journal.adopting = False
+    for job_id in scheduler.shutdown():
+        job_journal.release(job_id)
+    drained = wait_idle(scheduler, deadline, heartbeat)
+    # Closed only now, since downloads finishing above still hand their ffmpeg work to it
+    postprocess_pool.shutdown(cancel_pending=False)
+    return wait_idle(postprocess_pool, deadline, heartbeat) and drained
+
+def wait_idle(pool, deadline=None, heartbeat=None):
+    """Wait until a pool has no work left or the deadline passes, calling heartbeat every second"""
+    while True:
+        remaining = 1 if deadline is None else min(1, deadline - time.monotonic())
+        if pool.wait(max(0, remaining)):
+            return True
+        if remaining <= 0:
+            return False
+        if heartbeat:
+            heartbeat()
+
+def warm_up():
+    """Import yt-dlp and its extractors and leave a ready session in each pool"""
+    started = time.monotonic()
+    try:
+        for pool in ydl_sessions.values():
+            pool.prefill()
+        # Imported by the download and thumbnail paths on first use
+        import requests
+        import segmented_download
+        from PIL import Image
+    except Exception as e:
+        print(f"Warm-up failed: {e}")
+    else:
+        print(f"Warmed up in {time.monotonic() - started:.2f}s")
+    warmed_up.set()
+
+if RESUME_JOBS:
+    job_journal.start(resume_job)
+
+def start_warm_up():
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+# Under gunicorn, PRELOAD is handled by the post_worker_init hook in gunicorn.conf.py
+if WARM_UP and not PRELOAD and __name__ != '__main__':
+    start_warm_up()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Video Downloader web app (development server)')
+    parser.add_argument('--preload', action='store_true',
+                        help='load yt-dlp and its extractors before accepting requests')
+    args = parser.parse_args()
     os.makedirs('./downloads', exist_ok=True)
-    import os
+    if args.preload or PRELOAD:
+        warm_up()
+    elif WARM_UP:
+        start_warm_up()
     port = int(os.environ.get("PORT", 5000))
     app.run(host='0.0.0.0', port=port)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark yt-dlp sessions with all extractors against platform-only ones
+Each mode runs in a fresh interpreter and reports the time to import yt-dlp
+and build a first session, the peak resident memory, and the average time
+to find the extractor for a URL.
+
+Usage: python benchmark_extractors.py [matching rounds]
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+URLS = [
+    'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+    'https://youtu.be/dQw4w9WgXcQ',
+    'https://www.youtube.com/playlist?list=PLx0sYbCqOb8TBPRdmBHs5Iftvv9TPboYG',
+    'https://www.instagram.com/reel/Cabcdefg123/',
+    'https://www.instagram.com/p/Cabcdefg123/'
+]
+
+MODES = [
+    ('all extractors', {}, False),
+    ('all extractors, no lazy loading', {'YTDLP_NO_LAZY_EXTRACTORS': '1'}, False),
+    ('youtube + instagram only', {}, True)
+]
+
+# Runs in the child interpreter: argv is (restricted, rounds)
+CHILD = '''
+import json, resource, sys, time
+started = time.perf_counter()
+from session_pool import SessionPool, PLATFORM_EXTRACTORS
+restricted = sys.argv[1] == '1'
+pool = SessionPool({'quiet': True}, extractors=list(PLATFORM_EXTRACTORS.values()) if restricted else None)
+with pool.session() as ydl:
+    startup = time.perf_counter() - started
+    urls = json.loads(sys.argv[3])
+    rounds = int(sys.argv[2])
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for url in urls:
+            # Same search YoutubeDL.extract_info does before extracting
+            for ie in ydl._ies.values():
+                if ie.suitable(url):
+                    break
+    matching = (time.perf_counter() - started) / (rounds * len(urls))
+    extractors = len(ydl._ies)
+print(json.dumps({
+    'startup': startup,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'matching_us': matching * 1e6,
+    'extractors': extractors
+}))
+'''
+
+
+def run_mode(env, restricted, rounds):
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD, '1' if restricted else '0', str(rounds), json.dumps(URLS)],
+        env=dict(os.environ, **env), cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print("⏱️  yt-dlp Extractor Benchmark")
+    print("=" * 78)
+    print(f"{'mode':34} {'extractors':>10} {'startup':>10} {'peak RSS':>10} {'per URL':>10}")
+    for name, env, restricted in MODES:
+        result = run_mode(env, restricted, rounds)
+        print(f"{name:34} {result['extractors']:>10} {result['startup'] * 1000:>8.0f}ms "
+              f"{result['rss_mb']:>8.1f}MB {result['matching_us']:>8.1f}us")
+
+
+if __name__ == "__main__":
+    main()
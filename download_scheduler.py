@@ -0,0 +1,137 @@
+"""
+Download scheduler with a fixed worker pool and a bounded priority queue
+Keeps the number of concurrent yt-dlp sessions constant under load
+"""
+
+import bisect
+import itertools
+import threading
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class DownloadScheduler:
+    """Runs submitted jobs on a fixed number of worker threads
+
+    Jobs wait in a queue ordered by (priority, submission order), so lower
+    priority values run first and equal priorities are FIFO. Each priority
+    level is bounded separately, so background work such as batch items
+    can't use up the room reserved for interactive downloads.
+    """
+
+    def __init__(self, max_workers=4, max_queue=50, name='download-worker'):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pending = []  # sorted list of (priority, seq, job_id)
+        self._jobs = {}
+        self._running = set()
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.completed = 0
+        self.rejected = 0
+        self._workers = []
+        for i in range(max_workers):
+            worker = threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, job_id, fn, priority=0, max_queue=None):
+        """Queue a job and return its 1-based queue position
+
+        max_queue overrides the scheduler's limit for this priority level.
+        """
+        with self._cond:
+            if self._closed:
+                self.rejected += 1
+                raise QueueFullError('Server is shutting down')
+            if self._queued(priority) >= (max_queue or self.max_queue):
+                self.rejected += 1
+                raise QueueFullError('Download queue is full')
+            entry = (priority, next(self._counter), job_id)
+            bisect.insort(self._pending, entry)
+            self._jobs[job_id] = fn
+            self._cond.notify()
+            return self._pending.index(entry) + 1
+
+    def free_slots(self, priority=0, max_queue=None):
+        """Return how many more jobs of this priority the queue will accept"""
+        with self._cond:
+            return max(0, (max_queue or self.max_queue) - self._queued(priority))
+
+    def _queued(self, priority):
+        return sum(1 for entry in self._pending if entry[0] == priority)
+
+    def position(self, job_id):
+        """Return the 1-based queue position of a waiting job, or None"""
+        with self._cond:
+            for index, (_, _, pending_id) in enumerate(self._pending):
+                if pending_id == job_id:
+                    return index + 1
+        return None
+
+    def cancel(self, job_id):
+        """Remove a job that has not started yet; returns True if it was queued"""
+        with self._cond:
+            for index, (_, _, pending_id) in enumerate(self._pending):
+                if pending_id == job_id:
+                    del self._pending[index]
+                    self._jobs.pop(job_id, None)
+                    return True
+        return False
+
+    def shutdown(self, cancel_pending=True):
+        """Stop accepting jobs; workers exit once there is nothing left to run
+
+        With cancel_pending the queued jobs are dropped and their IDs
+        returned, otherwise they still run. Running jobs always finish; use
+        wait() to block until they have.
+        """
+        with self._cond:
+            self._closed = True
+            cancelled = []
+            if cancel_pending:
+                cancelled = [job_id for _, _, job_id in self._pending]
+                self._pending.clear()
+                self._jobs.clear()
+            self._cond.notify_all()
+            return cancelled
+
+    def wait(self, timeout=None):
+        """Block until no job is queued or running; returns False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._running, timeout)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    if self._closed:
+                        return
+                    self._cond.wait()
+                _, _, job_id = self._pending.pop(0)
+                fn = self._jobs.pop(job_id)
+                self._running.add(job_id)
+            try:
+                fn()
+            except Exception as e:
+                print(f"Download job {job_id} failed: {e}")
+            finally:
+                with self._cond:
+                    self._running.discard(job_id)
+                    self.completed += 1
+                    self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'workers': self.max_workers,
+                'running': len(self._running),
+                'queued': len(self._pending),
+                'max_queue': self.max_queue,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'closed': self._closed,
+            }
@@ -0,0 +1,7 @@
+"""
+Front-end independent core of the video downloader
+Used by both the Flask web app and the Kivy app; imports neither.
+"""
+
+from downloader_core.formats import FormatEntry, FormatIndex, format_options
+from downloader_core.info import format_duration, format_views, youtube_summary, instagram_summary
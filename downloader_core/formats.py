@@ -0,0 +1,183 @@
+"""
+Per-video index of yt-dlp formats
+Built in a single pass when video info is fetched. Both front ends list
+qualities from it, and downloads resolve an exact format_id (or
+video+audio pair) with a dictionary lookup.
+"""
+
+from collections import namedtuple
+
+# One downloadable stream of a video
+FormatEntry = namedtuple('FormatEntry', 'format_id height has_audio ext codec filesize abr')
+
+MP4_AUDIO_EXTS = ('m4a', 'mp4', 'aac')
+
+# Containers offered in the quality lists
+VIDEO_ONLY_EXTS = ('mp4', 'webm')
+LISTED_AUDIO_EXTS = ('m4a', 'mp3', 'aac')
+MIN_VIDEO_ONLY_HEIGHT = 240
+
+
+def _size(entry):
+    # Unknown sizes sort after known ones
+    return entry.filesize if entry.filesize else float('inf')
+
+
+class FormatIndex:
+    """Best format per (height, has_audio) and per audio bitrate"""
+
+    def __init__(self, formats):
+        self.entries = {}  # (height, has_audio) -> FormatEntry
+        self.audio_by_abr = {}  # rounded abr -> FormatEntry
+        self.audio = None
+
+        for fmt in formats:
+            vcodec = fmt.get('vcodec')
+            acodec = fmt.get('acodec')
+            has_video = vcodec not in (None, 'none')
+            has_audio = acodec not in (None, 'none')
+            entry = FormatEntry(
+                format_id=fmt.get('format_id'),
+                height=fmt.get('height'),
+                has_audio=has_audio,
+                ext=fmt.get('ext'),
+                codec=vcodec if has_video else acodec,
+                filesize=fmt.get('filesize') or fmt.get('filesize_approx'),
+                abr=fmt.get('abr') or 0
+            )
+            if not entry.format_id:
+                continue
+
+            if has_video and entry.height:
+                key = (entry.height, has_audio)
+                current = self.entries.get(key)
+                if current is None or self._better_video(entry, current):
+                    self.entries[key] = entry
+            elif has_audio and not has_video:
+                abr = int(entry.abr)
+                current = self.audio_by_abr.get(abr)
+                if current is None or self._better_audio(entry, current):
+                    self.audio_by_abr[abr] = entry
+                if self.audio is None or self._better_audio(entry, self.audio):
+                    self.audio = entry
+
+    @staticmethod
+    def _better_video(entry, current):
+        # Prefer streams that merge into mp4 without re-encoding, then the smaller transfer
+        entry_mp4 = entry.ext == 'mp4'
+        current_mp4 = current.ext == 'mp4'
+        if entry_mp4 != current_mp4:
+            return entry_mp4
+        return _size(entry) < _size(current)
+
+    @staticmethod
+    def _better_audio(entry, current):
+        entry_mp4 = entry.ext in MP4_AUDIO_EXTS
+        current_mp4 = current.ext in MP4_AUDIO_EXTS
+        if entry_mp4 != current_mp4:
+            return entry_mp4
+        return entry.abr > current.abr
+
+    def video_formats(self):
+        """Quality list entries for video, one per height, highest first
+
+        A progressive mp4 is listed when there is one; otherwise the best
+        video-only stream, which gets merged with audio on download.
+        """
+        formats = []
+        for height in sorted({height for height, _ in self.entries}, reverse=True):
+            entry = self.entries.get((height, True))
+            if entry is None or entry.ext != 'mp4':
+                entry = self.entries.get((height, False))
+                if entry is None or entry.ext not in VIDEO_ONLY_EXTS or height < MIN_VIDEO_ONLY_HEIGHT:
+                    continue
+            formats.append({
+                'height': height,
+                'format_id': entry.format_id,
+                'ext': entry.ext,
+                'filesize': entry.filesize,
+                'quality': f"{height}p",
+                'has_audio': entry.has_audio
+            })
+        return formats
+
+    def audio_formats(self):
+        """Quality list entries for audio, one per bitrate, highest first"""
+        formats = []
+        for abr in sorted(self.audio_by_abr, reverse=True):
+            entry = self.audio_by_abr[abr]
+            if abr and entry.ext in LISTED_AUDIO_EXTS:
+                formats.append({
+                    'abr': entry.abr,
+                    'format_id': entry.format_id,
+                    'ext': entry.ext,
+                    'filesize': entry.filesize,
+                    'quality': f"{abr}kbps"
+                })
+        return formats
+
+    def get(self, height, has_audio):
+        return self.entries.get((height, has_audio))
+
+    def resolve_video(self, height):
+        """Return the exact format_id (or 'video+audio' pair) for a height, or None"""
+        progressive = self.entries.get((height, True))
+        if progressive:
+            return progressive.format_id
+        video_only = self.entries.get((height, False))
+        if video_only and self.audio:
+            return f"{video_only.format_id}+{self.audio.format_id}"
+        if video_only:
+            return video_only.format_id
+        return None
+
+    def resolve_audio(self, abr=None):
+        """Return the format_id of the audio-only stream with this bitrate, or the best one"""
+        entry = self.audio_by_abr.get(int(abr)) if abr else None
+        entry = entry or self.audio
+        return entry.format_id if entry else None
+
+
+def format_options(platform, quality, format_type, index=None, audio_format='mp3'):
+    """Return the yt-dlp format and postprocessing options for a request
+
+    When the video's FormatIndex is available the exact format_id (or
+    video+audio pair) is looked up, so yt-dlp doesn't re-select a stream;
+    the generic selector after '/' is only used if that format disappears.
+    Audio is converted to mp3, or kept as m4a, which copies the AAC stream
+    YouTube serves instead of re-encoding it.
+    """
+    if platform != 'youtube':
+        return {'format': 'best[ext=mp4]/best'}
+
+    prefer_aac_audio = "bestaudio[ext=m4a]/bestaudio[ext=aac]/bestaudio"
+
+    if format_type == "video":
+        if quality == 'best':
+            return {
+                'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best',
+                'merge_output_format': 'mp4'
+            }
+
+        # Parse quality (e.g., "720p (with audio)" or "720p (video only)")
+        height = int(quality.split('p')[0])
+
+        selector = (f"bestvideo[height<={height}]+bestaudio[ext=m4a]/bestvideo[height<={height}]+bestaudio"
+                    f"/best[height<={height}]/best")
+        exact = index.resolve_video(height) if index else None
+        if exact:
+            selector = f"{exact}/{selector}"
+
+        return {'format': selector, 'merge_output_format': 'mp4'}
+
+    # Audio only (e.g., "128kbps")
+    abr = int(quality.split('kbps')[0]) if 'kbps' in quality else None
+    exact = index.resolve_audio(abr) if index else None
+    return {
+        'format': f"{exact}/{prefer_aac_audio}" if exact else prefer_aac_audio,
+        'postprocessors': [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': audio_format,
+            'preferredquality': '192',
+        }]
+    }
@@ -0,0 +1,62 @@
+"""
+Video info summaries shown by the web and Kivy front ends
+"""
+
+from downloader_core.formats import FormatIndex
+
+
+def format_duration(seconds):
+    if not seconds:
+        return "Unknown"
+
+    seconds = int(seconds)
+    hours = seconds // 3600
+    minutes = (seconds % 3600) // 60
+    seconds = seconds % 60
+
+    if hours > 0:
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    else:
+        return f"{minutes:02d}:{seconds:02d}"
+
+
+def format_views(views):
+    if not views:
+        return "Unknown"
+
+    if views >= 1_000_000:
+        return f"{views/1_000_000:.1f}M"
+    elif views >= 1_000:
+        return f"{views/1_000:.1f}K"
+    else:
+        return str(views)
+
+
+def youtube_summary(info, url, index=None):
+    """Return the info shown for a YouTube video
+
+    `index` is the video's FormatIndex if the caller already built one.
+    """
+    if index is None:
+        index = FormatIndex(info.get('formats') or [])
+    return {
+        'success': True,
+        'title': info.get('title', 'Unknown Title'),
+        'duration': format_duration(info.get('duration', 0)),
+        'views': format_views(info.get('view_count', 0)),
+        'thumbnail': info.get('thumbnail'),
+        'video_formats': index.video_formats(),
+        'audio_formats': index.audio_formats(),
+        'url': url
+    }
+
+
+def instagram_summary(info, url):
+    """Return the info shown for an Instagram reel"""
+    return {
+        'success': True,
+        'title': info.get('title', 'Instagram Reel'),
+        'uploader': info.get('uploader', 'Unknown User'),
+        'thumbnail': info.get('thumbnail'),
+        'url': url
+    }
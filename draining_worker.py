@@ -0,0 +1,34 @@
+"""
+gunicorn worker that drains background downloads before exiting
+Downloads run on the app's own worker pools, outside any request, so a
+stock worker would kill them when it stops or is recycled. This one first
+finishes serving requests like gunicorn's threaded worker, then waits for
+the app's downloads (see app.drain) while still reporting to the master.
+"""
+
+import time
+
+from gunicorn.workers.gthread import ThreadWorker
+
+
+class DrainingWorker(ThreadWorker):
+    """Threaded worker that waits for in-flight downloads before it exits"""
+
+    last_notified = None
+
+    def notify(self):
+        super().notify()
+        self.last_notified = time.monotonic()
+
+    def run(self):
+        super().run()
+        import app
+        # The request loop notifies the master every second until it stops, so the
+        # last notification shows when the graceful timeout started running
+        elapsed = time.monotonic() - (self.last_notified or time.monotonic())
+        timeout = max(1, self.cfg.graceful_timeout - elapsed - 5)
+        self.log.info("Draining downloads (pid: %s)", self.pid)
+        if app.drain(timeout=timeout, heartbeat=self.notify):
+            self.log.info("Downloads drained (pid: %s)", self.pid)
+        else:
+            self.log.warning("Downloads still running, leaving them to the job journal (pid: %s)", self.pid)
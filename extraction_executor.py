@@ -0,0 +1,141 @@
+"""
+Bounded executor for video info extraction
+Runs yt-dlp extractions on a small worker pool per platform so slow
+extractions can't take over the web server's request threads. Identical
+requests share one extraction, and an extraction nobody waits for any more
+(timeout or client disconnect) is cancelled if it hasn't started yet.
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from download_scheduler import DownloadScheduler, QueueFullError
+
+
+class ExtractionTimeout(Exception):
+    """Raised when an extraction doesn't finish within the caller's timeout"""
+
+
+class ExtractionCancelled(Exception):
+    """Raised when the caller stopped waiting for an extraction"""
+
+
+class _Extraction:
+    __slots__ = ('future', 'job_id', 'waiters')
+
+    def __init__(self):
+        self.future = Future()
+        self.job_id = uuid.uuid4().hex
+        self.waiters = 1
+
+
+class ExtractionExecutor:
+    """Per-platform worker pools for extractions, with a bounded queue each
+
+    `limits` maps each platform to the number of extractions it may run at
+    the same time. `max_waiters` caps the callers blocked in run() across
+    all platforms, including those sharing an extraction, so waiting for
+    extractions can't use up the web server's request threads.
+    """
+
+    def __init__(self, limits, max_queue=20, max_waiters=None, poll_interval=0.5):
+        self.pools = {
+            platform: DownloadScheduler(max_workers=limit, max_queue=max_queue, name=f'extract-{platform}')
+            for platform, limit in limits.items()
+        }
+        self.max_waiters = max_waiters
+        self.poll_interval = poll_interval
+        self._waiting = 0
+        self._inflight = {}  # (platform, key) -> _Extraction
+        self._lock = threading.Lock()
+        self.shared = 0
+        self.cancelled = 0
+        self.timeouts = 0
+
+    def run(self, platform, key, fn, timeout=None, abandoned=None):
+        """Run fn() on the platform's pool and return its result
+
+        Calls with the same platform and key while one is pending share it.
+        `abandoned` is polled while waiting; when it returns True, or after
+        `timeout` seconds, the caller stops waiting. Raises QueueFullError,
+        ExtractionTimeout or ExtractionCancelled.
+        """
+        extraction = self._submit(platform, key, fn)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while True:
+                wait = self.poll_interval
+                if deadline is not None:
+                    wait = max(0, min(wait, deadline - time.monotonic()))
+                try:
+                    return extraction.future.result(timeout=wait)
+                except FutureTimeout:
+                    pass
+                if abandoned is not None and abandoned():
+                    raise ExtractionCancelled('Client disconnected')
+                if deadline is not None and time.monotonic() >= deadline:
+                    with self._lock:
+                        self.timeouts += 1
+                    raise ExtractionTimeout(f'Extraction took longer than {timeout}s')
+        finally:
+            self._release(platform, key, extraction)
+
+    def _submit(self, platform, key, fn):
+        with self._lock:
+            if self.max_waiters is not None and self._waiting >= self.max_waiters:
+                raise QueueFullError('Too many video info requests')
+            extraction = self._inflight.get((platform, key))
+            if extraction is not None:
+                extraction.waiters += 1
+                self._waiting += 1
+                self.shared += 1
+                return extraction
+            extraction = _Extraction()
+            try:
+                self.pools[platform].submit(extraction.job_id, lambda: self._execute(platform, key, extraction, fn))
+            except QueueFullError:
+                raise QueueFullError('Too many video info requests')
+            self._inflight[(platform, key)] = extraction
+            self._waiting += 1
+            return extraction
+
+    def _execute(self, platform, key, extraction, fn):
+        if not extraction.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = fn()
+        except Exception as e:
+            extraction.future.set_exception(e)
+        else:
+            extraction.future.set_result(result)
+        finally:
+            with self._lock:
+                if self._inflight.get((platform, key)) is extraction:
+                    del self._inflight[(platform, key)]
+
+    def _release(self, platform, key, extraction):
+        # Cancel an extraction that hasn't started once its last waiter is gone.
+        # One that is already running finishes and fills the metadata cache.
+        with self._lock:
+            extraction.waiters -= 1
+            self._waiting -= 1
+            if extraction.waiters or extraction.future.done():
+                return
+            if self.pools[platform].cancel(extraction.job_id):
+                extraction.future.cancel()
+                del self._inflight[(platform, key)]
+                self.cancelled += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pools': {platform: pool.stats() for platform, pool in self.pools.items()},
+                'in_flight': len(self._inflight),
+                'waiting': self._waiting,
+                'max_waiters': self.max_waiters,
+                'shared': self.shared,
+                'cancelled': self.cancelled,
+                'timeouts': self.timeouts
+            }
@@ -0,0 +1,53 @@
+"""
+gunicorn settings for production serving
+Run `gunicorn` from the project directory; settings come from the
+environment variables below (see README).
+"""
+
+import os
+import sys
+
+wsgi_app = 'app:app'
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+# app.py starts its download, postprocessing and extraction worker threads
+# and the job journal thread at import. Threads don't survive fork, so the
+# app must be imported in each worker, never preloaded in the master.
+preload_app = False
+
+# Threaded workers so slow clients, file transfers and progress streams
+# don't tie up a whole process. More than one worker process needs
+# JOB_STATE_BACKEND=sqlite so every worker sees every job's progress.
+# Every /api/fetch_info caller waiting for an extraction and every open
+# progress stream holds one of the threads; app.py caps them at
+# MAX_EXTRACTION_WAITERS (half of WEB_THREADS by default) and
+# MAX_PROGRESS_STREAMS (a quarter), so keep their sum below WEB_THREADS.
+worker_class = 'draining_worker.DrainingWorker'
+workers = int(os.environ.get('WEB_WORKERS', 1))
+threads = int(os.environ.get('WEB_THREADS', 32))
+keepalive = int(os.environ.get('KEEPALIVE', 5))
+timeout = int(os.environ.get('WORKER_TIMEOUT', 60))
+
+# How long a stopping or recycled worker may spend finishing its requests
+# and downloads; whatever is left is resumed from the job journal
+graceful_timeout = int(os.environ.get('DRAIN_TIMEOUT', 300))
+
+# Recycle workers after this many requests (0 never recycles). A worker is
+# only replaced once it has drained, so recycle with more than one worker.
+max_requests = int(os.environ.get('MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+
+
+def on_starting(server):
+    if server.cfg.preload_app:
+        sys.exit("The app can't be preloaded (its worker threads don't survive fork); "
+                 "drop gunicorn's --preload option")
+
+
+def post_worker_init(worker):
+    # With PRELOAD=1 each worker loads yt-dlp before it starts taking requests
+    import app
+    if app.PRELOAD:
+        app.warm_up()
@@ -0,0 +1,169 @@
+"""
+Persistent journal of unfinished download jobs
+Records each job's request, resolved format, output path and bytes completed
+in SQLite so jobs interrupted by a restart can be queued again and resumed
+from their partial files.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+
+class JobJournal:
+    """SQLite journal of queued and running download jobs
+
+    Each process owns the jobs it started and renews a lease on them. Jobs
+    whose lease runs out belong to a process that has stopped; any process
+    sharing the journal adopts them through `adopt_orphans`.
+    """
+
+    def __init__(self, path, lease=30, min_update_interval=1.0):
+        self.path = path
+        self.lease = lease
+        self.min_update_interval = min_update_interval
+        self.instance = uuid.uuid4().hex
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._last_progress = {}
+        self.resumed = 0
+        # Cleared while the process shuts down so it stops taking on jobs
+        self.adopting = True
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS journal (
+                job_id TEXT PRIMARY KEY,
+                request TEXT NOT NULL,
+                format_id TEXT,
+                filepath TEXT,
+                downloaded_bytes INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                owner TEXT NOT NULL,
+                lease_until REAL NOT NULL
+            )
+        """)
+
+    def _conn(self):
+        # sqlite3 connections can't be shared between threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def add(self, job_id, request):
+        """Record a job; `request` is the JSON-serializable dict needed to start it again
+
+        Adding a job that is already journaled (a resumed one) keeps its
+        recorded format, path and progress.
+        """
+        self._conn().execute("""
+            INSERT INTO journal (job_id, request, created_at, owner, lease_until)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (job_id) DO UPDATE SET
+                request = excluded.request,
+                owner = excluded.owner,
+                lease_until = excluded.lease_until
+        """, (job_id, json.dumps(request), time.time(), self.instance, time.time() + self.lease))
+
+    def update(self, job_id, format_id=None, filepath=None):
+        """Record the format and output path a job resolved to"""
+        self._conn().execute("""
+            UPDATE journal SET format_id = COALESCE(?, format_id), filepath = COALESCE(?, filepath)
+            WHERE job_id = ?
+        """, (format_id, filepath, job_id))
+
+    def progress(self, job_id, downloaded_bytes):
+        """Record bytes completed, at most once every `min_update_interval` seconds"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_progress.get(job_id, 0) < self.min_update_interval:
+                return
+            self._last_progress[job_id] = now
+        self._conn().execute('UPDATE journal SET downloaded_bytes = ? WHERE job_id = ?',
+                             (downloaded_bytes, job_id))
+
+    def remove(self, job_id):
+        """Forget a job once it has completed or failed"""
+        self._conn().execute('DELETE FROM journal WHERE job_id = ?', (job_id,))
+        with self._lock:
+            self._last_progress.pop(job_id, None)
+
+    def renew(self):
+        """Extend the lease on every job owned by this process"""
+        self._conn().execute('UPDATE journal SET lease_until = ? WHERE owner = ?',
+                             (time.time() + self.lease, self.instance))
+
+    def adopt_orphans(self):
+        """Take over jobs whose owner stopped renewing its lease, oldest first
+
+        Returns a list of dicts with job_id, request, format_id, filepath and
+        downloaded_bytes for each adopted job.
+        """
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute("""
+                SELECT job_id, request, format_id, filepath, downloaded_bytes FROM journal
+                WHERE lease_until < ? AND owner != ? ORDER BY created_at
+            """, (now, self.instance)).fetchall()
+            conn.executemany('UPDATE journal SET owner = ?, lease_until = ? WHERE job_id = ?',
+                             [(self.instance, now + self.lease, row[0]) for row in rows])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self.resumed += len(rows)
+        return [{
+            'job_id': job_id,
+            'request': json.loads(request),
+            'format_id': format_id,
+            'filepath': filepath,
+            'downloaded_bytes': downloaded_bytes
+        } for job_id, request, format_id, filepath, downloaded_bytes in rows]
+
+    def release(self, job_id):
+        """Give up a job so another process (or a later adopt_orphans call) takes it"""
+        self._conn().execute("UPDATE journal SET owner = '', lease_until = 0 WHERE job_id = ?", (job_id,))
+
+    def start(self, on_orphan, interval=None):
+        """Renew leases and adopt orphaned jobs in a background thread
+
+        `on_orphan` is called with each adopted job's dict.
+        """
+        interval = interval or self.lease / 3
+
+        def run():
+            while True:
+                try:
+                    self.renew()
+                    if self.adopting:
+                        for job in self.adopt_orphans():
+                            on_orphan(job)
+                except Exception as e:
+                    print(f"Job journal error: {e}")
+                time.sleep(interval)
+
+        thread = threading.Thread(target=run, name='job-journal', daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        conn = self._conn()
+        pending, owned = conn.execute(
+            'SELECT COUNT(*), COUNT(CASE WHEN owner = ? THEN 1 END) FROM journal', (self.instance,)
+        ).fetchone()
+        return {
+            'pending': pending,
+            'owned': owned,
+            'resumed': self.resumed
+        }
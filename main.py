@@ -13,6 +13,7 @@ from kivy.uix.scrollview import ScrollView
 from kivy.uix.modalview import ModalView
 from kivy.clock import Clock
 from kivy.core.window import Window
+from kivy.core.image import Image as CoreImage
 from kivy.utils import platform
 import threading
 import requests
@@ -22,15 +23,133 @@ import subprocess
 import sys
 import yt_dlp
 import uuid
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
+from urllib.parse import urlsplit
+from downloader_core import FormatIndex, format_options, youtube_summary, instagram_summary
+
+class ThumbnailLoader:
+    """Loads thumbnails off the UI thread, with in-memory texture and on-disk caches
+    
+    Network and disk I/O run on a small thread pool; only turning the bytes
+    into a texture happens on the Kivy main thread, as OpenGL requires.
+    """
+    
+    def __init__(self, cache_dir, memory_entries=32, disk_entries=200, timeout=10):
+        self.cache_dir = cache_dir
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.timeout = timeout
+        self._textures = OrderedDict()  # url -> texture, least recently used first
+        self._executor = ThreadPoolExecutor(max_workers=2)
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    def load(self, url, callback):
+        """Call callback(texture) on the main thread once the thumbnail is available
+        
+        Must be called from the main thread. A cached texture is delivered
+        immediately; otherwise callback(None) is called if loading fails.
+        """
+        texture = self._textures.get(url)
+        if texture is not None:
+            self._textures.move_to_end(url)
+            callback(texture)
+            return
+        self._executor.submit(self._fetch, url, callback)
+    
+    def _path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.img')
+    
+    def _fetch(self, url, callback):
+        # Runs on the loader's thread pool
+        path = self._path(url)
+        data = None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            try:
+                response = requests.get(url, timeout=self.timeout)
+                response.raise_for_status()
+                data = response.content
+                self._store(path, data)
+            except Exception as e:
+                print(f"Thumbnail load error: {e}")
+        Clock.schedule_once(lambda dt: self._deliver(url, data, callback))
+    
+    def _store(self, path, data):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        
+        # Keep only the most recently used files
+        entries = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith('.img')]
+        if len(entries) > self.disk_entries:
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in entries[:len(entries) - self.disk_entries]:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+    
+    def _deliver(self, url, data, callback):
+        texture = None
+        if data:
+            try:
+                # The extension only picks the decoder; YouTube serves both jpg and webp
+                ext = os.path.splitext(urlsplit(url).path)[1].lstrip('.').lower() or 'jpg'
+                texture = CoreImage(BytesIO(data), ext=ext).texture
+            except Exception as e:
+                print(f"Thumbnail decode error: {e}")
+        if texture is not None:
+            self._textures[url] = texture
+            self._textures.move_to_end(url)
+            while len(self._textures) > self.memory_entries:
+                self._textures.popitem(last=False)
+        callback(texture)
+
+class ProgressChannel:
+    """Passes progress from download threads to the UI at a capped frame rate
+    
+    Only the latest state is kept; however often put() is called, the UI
+    callback runs at most max_fps times a second on the main thread.
+    """
+    
+    def __init__(self, callback, max_fps=10):
+        self.callback = callback
+        self._latest = None
+        self._lock = threading.Lock()
+        self._trigger = Clock.create_trigger(self._flush, 1.0 / max_fps)
+    
+    def put(self, *state):
+        """Record the latest state; safe to call from any thread"""
+        with self._lock:
+            pending = self._latest is not None
+            self._latest = state
+        if not pending:
+            self._trigger()
+    
+    def _flush(self, dt):
+        with self._lock:
+            state, self._latest = self._latest, None
+        if state is not None:
+            self.callback(*state)
 
 class VideoDownloaderApp(App):
     def build(self):
         self.title = "Video Downloader"
         self.current_platform = "youtube"
         self.video_info = None
+        self.format_index = None
         self.download_progress = {}
         self.active_downloads = {}
+        self.thumbnail_loader = ThumbnailLoader(os.path.join(self.user_data_dir, 'thumbnails'))
+        self.thumbnail_url = None
+        self.progress_channel = ProgressChannel(self.update_progress)
         
         # Main layout
         main_layout = BoxLayout(orientation='vertical', padding=10, spacing=10)
@@ -267,50 +386,9 @@ class VideoDownloaderApp(App):
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
                 info = ydl.extract_info(url, download=False)
             
-            formats = info.get('formats', [])
-            video_formats = []
-            audio_formats = []
-            
-            for fmt in formats:
-                if (fmt.get('vcodec') != 'none' and fmt.get('acodec') != 'none' and 
-                    fmt.get('ext') == 'mp4'):
-                    height = fmt.get('height')
-                    if height:
-                        video_formats.append({
-                            'height': height,
-                            'format_id': fmt['format_id'],
-                            'ext': fmt.get('ext', 'mp4'),
-                            'filesize': fmt.get('filesize'),
-                            'quality': f"{height}p",
-                            'has_audio': True
-                        })
-                
-                elif (fmt.get('acodec') != 'none' and fmt.get('vcodec') == 'none'):
-                    abr = fmt.get('abr', 0)
-                    ext = fmt.get('ext', '')
-                    if abr and ext in ['m4a', 'mp3', 'aac']:
-                        audio_formats.append({
-                            'abr': abr,
-                            'format_id': fmt['format_id'],
-                            'ext': ext,
-                            'filesize': fmt.get('filesize'),
-                            'quality': f"{int(abr)}kbps"
-                        })
-            
-            video_formats = self._remove_duplicate_formats(video_formats)
-            video_formats.sort(key=lambda x: x['height'], reverse=True)
-            audio_formats.sort(key=lambda x: x['abr'], reverse=True)
-            
-            return {
-                'success': True,
-                'title': info.get('title', 'Unknown Title'),
-                'duration': self._format_duration(info.get('duration', 0)),
-                'views': self._format_views(info.get('view_count', 0)),
-                'thumbnail': info.get('thumbnail'),
-                'video_formats': video_formats,
-                'audio_formats': audio_formats,
-                'url': url
-            }
+            # Kept so the download picks the exact stream behind the chosen quality
+            self.format_index = FormatIndex(info.get('formats') or [])
+            return youtube_summary(info, url, self.format_index)
             
         except Exception as e:
             return {'success': False, 'error': str(e)}
@@ -327,59 +405,18 @@ class VideoDownloaderApp(App):
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
                 info = ydl.extract_info(url, download=False)
             
-            return {
-                'success': True,
-                'title': info.get('title', 'Instagram Reel'),
-                'uploader': info.get('uploader', 'Unknown User'),
-                'thumbnail': info.get('thumbnail'),
-                'url': url
-            }
+            return instagram_summary(info, url)
             
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
-    def _remove_duplicate_formats(self, formats):
-        seen = {}
-        for fmt in formats:
-            height = fmt['height']
-            if height not in seen:
-                seen[height] = fmt
-            elif fmt.get('has_audio', False) and not seen[height].get('has_audio', False):
-                seen[height] = fmt
-        return list(seen.values())
-    
-    def _format_duration(self, seconds):
-        if not seconds:
-            return "Unknown"
-        
-        hours = seconds // 3600
-        minutes = (seconds % 3600) // 60
-        seconds = seconds % 60
-        
-        if hours > 0:
-            return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-        else:
-            return f"{minutes:02d}:{seconds:02d}"
-    
-    def _format_views(self, views):
-        if not views:
-            return "Unknown"
-        
-        if views >= 1_000_000:
-            return f"{views/1_000_000:.1f}M"
-        elif views >= 1_000:
-            return f"{views/1_000:.1f}K"
-        else:
-            return str(views)
-    
     def display_video_info(self, info):
-        # Load thumbnail
-        try:
-            if info.get('thumbnail'):
-                response = requests.get(info['thumbnail'])
-                self.thumbnail.texture = Image(BytesIO(response.content)).texture
-        except:
-            pass
+        # Load thumbnail in the background; the rest of the info shows right away
+        self.thumbnail.texture = None
+        self.thumbnail_url = info.get('thumbnail')
+        if self.thumbnail_url:
+            url = self.thumbnail_url
+            self.thumbnail_loader.load(url, lambda texture: self._on_thumbnail_loaded(url, texture))
         
         self.video_title.text = info.get('title', 'Unknown Title')
         
@@ -392,6 +429,11 @@ class VideoDownloaderApp(App):
         
         self.show_video_info()
     
+    def _on_thumbnail_loaded(self, url, texture):
+        # Ignore thumbnails of a video that is no longer displayed
+        if texture is not None and url == self.thumbnail_url:
+            self.thumbnail.texture = texture
+    
     def show_video_info(self):
         self.video_info_layout.opacity = 1
         self.video_info_layout.size_hint_y = None
@@ -467,22 +509,11 @@ class VideoDownloaderApp(App):
             'progress_hooks': [lambda d: self.progress_hook(d, download_id)],
         }
         
-        if self.video_format_btn.state == 'down':
-            # Video format
-            if 'p' in quality:
-                height = int(quality.split('p')[0])
-                ydl_opts['format'] = f"best[height<={height}]+bestaudio/best"
-            else:
-                ydl_opts['format'] = 'best'
-            ydl_opts['merge_output_format'] = 'mp4'
-        else:
-            # Audio format
-            ydl_opts['format'] = 'bestaudio[ext=m4a]/bestaudio[ext=aac]/bestaudio'
-            ydl_opts['postprocessors'] = [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }]
+        # Quality labels look like "1080p (video only)" or "128kbps (m4a)"
+        format_type = 'video' if self.video_format_btn.state == 'down' else 'audio'
+        if format_type == 'video' and 'p' not in quality:
+            quality = 'best'
+        ydl_opts.update(format_options('youtube', quality, format_type, self.format_index))
         
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             ydl.download([url])
@@ -509,13 +540,16 @@ class VideoDownloaderApp(App):
         try:
             status = d.get('status')
             if status == 'downloading':
-                percent = d.get('percent', 0)
-                speed = d.get('_speed_str', '')
+                # yt-dlp reports bytes, not a 'percent' key
+                total = d.get('total_bytes') or d.get('total_bytes_estimate')
+                downloaded = d.get('downloaded_bytes') or 0
+                percent = min(100.0, downloaded / total * 100) if total else 0
+                speed = d.get('_speed_str', '').strip()
                 eta = d.get('_eta_str', '')
                 
-                Clock.schedule_once(lambda dt: self.update_progress(percent, speed, eta))
+                self.progress_channel.put(percent, speed, eta)
             elif status == 'finished':
-                Clock.schedule_once(lambda dt: self.update_progress(100, '', 'Completed!'))
+                self.progress_channel.put(100, '', 'Completed!')
         except Exception as e:
             print(f"Progress hook error: {e}")
     
@@ -0,0 +1,179 @@
+"""
+Content-addressed store of downloaded media
+Files are keyed by platform, video ID, resolved format ID(s) and postprocessing
+options, so a repeat request can be served from disk instead of the network.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: only one process uses the store
+    fcntl = None
+
+
+def media_key(platform, video_id, format_id, postprocessing=None):
+    """Build the store key for a resolved download"""
+    return json.dumps([platform, video_id, format_id, postprocessing or {}], sort_keys=True)
+
+
+class MediaStore:
+    """Directory of downloaded files with an on-disk JSON index and LRU size quota
+
+    Several processes can share a store: each keeps a copy of the index,
+    reloads it when the file changes, and merges its own access times into
+    the file under a lock before writing. Entries whose file has
+    disappeared are dropped on lookup.
+    """
+
+    def __init__(self, root, max_bytes=10 * 1024 ** 3):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(root, 'index.json')
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(root, exist_ok=True)
+        self._index = {}
+        self._index_mtime = None
+        self._reload_index()
+
+    @contextmanager
+    def _index_lock(self):
+        # Serializes read-modify-write of the index file between processes
+        with open(f"{self.index_path}.lock", 'a') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _refresh_index(self):
+        try:
+            mtime = os.stat(self.index_path).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._index_mtime:
+            self._reload_index()
+
+    def _reload_index(self):
+        # Take the entries other processes added or evicted, keeping this
+        # process's more recent access times
+        try:
+            self._index_mtime = os.stat(self.index_path).st_mtime_ns
+        except OSError:
+            self._index_mtime = None
+        index = self._load_index()
+        for key, entry in index.items():
+            mine = self._index.get(key)
+            if mine and mine['file'] == entry['file']:
+                entry['last_access'] = max(entry['last_access'], mine['last_access'])
+        self._index = index
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self.index_path)
+        self._index_mtime = os.stat(self.index_path).st_mtime_ns
+
+    def _path(self, entry):
+        return os.path.join(self.root, entry['file'])
+
+    def get(self, key):
+        """Return the stored file for a key, or None if it isn't in the store"""
+        with self._lock:
+            self._refresh_index()
+            entry = self._index.get(key)
+            if entry and not os.path.exists(self._path(entry)):
+                del self._index[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            entry['last_access'] = time.time()
+            self.hits += 1
+            return self._path(entry)
+
+    def add(self, key, source_path, ext=None):
+        """Add a downloaded file to the store and return its stored path"""
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+        filename = digest + (f".{ext}" if ext else os.path.splitext(source_path)[1])
+        stored_path = os.path.join(self.root, filename)
+        with self._lock, self._index_lock():
+            self._reload_index()
+            if os.path.abspath(source_path) != os.path.abspath(stored_path):
+                if os.path.exists(stored_path):
+                    os.remove(stored_path)
+                link_or_copy(source_path, stored_path)
+            now = time.time()
+            self._index[key] = {
+                'file': filename,
+                'size': os.path.getsize(stored_path),
+                'created': now,
+                'last_access': now
+            }
+            self._evict(keep=key)
+            self._save_index()
+        return stored_path
+
+    def materialize(self, stored_path, dest_path):
+        """Place a stored file at dest_path and return dest_path"""
+        if os.path.exists(dest_path):
+            if os.path.samefile(stored_path, dest_path):
+                return dest_path
+            os.remove(dest_path)
+        link_or_copy(stored_path, dest_path)
+        return dest_path
+
+    def _evict(self, keep=None):
+        # Drop least recently used entries until the store fits its quota
+        total = sum(entry['size'] for entry in self._index.values())
+        by_age = sorted(self._index.items(), key=lambda item: item[1]['last_access'])
+        for key, entry in by_age:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                os.remove(self._path(entry))
+            except OSError:
+                pass
+            del self._index[key]
+            total -= entry['size']
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            self._refresh_index()
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._index),
+                'bytes': sum(entry['size'] for entry in self._index.values()),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions
+            }
+
+
+def link_or_copy(source_path, dest_path):
+    """Hard-link a file into place, copying when linking isn't possible"""
+    os.makedirs(os.path.dirname(os.path.abspath(dest_path)), exist_ok=True)
+    try:
+        os.link(source_path, dest_path)
+    except OSError:
+        shutil.copy2(source_path, dest_path)
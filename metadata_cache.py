@@ -0,0 +1,97 @@
+"""
+Metadata cache for yt-dlp extraction results
+Keeps recently fetched video info in memory so repeat lookups skip extract_info
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Patterns used to turn the many URL shapes of a video into one stable ID
+YOUTUBE_ID_RE = re.compile(r'(?:[?&]v=|/shorts/|/embed/|/live/|/v/|youtu\.be/)([0-9A-Za-z_-]{11})')
+INSTAGRAM_ID_RE = re.compile(r'instagram\.com/(?:[^/?#]+/)?(?:p|reel|reels|tv)/([0-9A-Za-z_-]+)')
+
+# Seconds a cached entry stays valid. YouTube stream URLs expire after a few
+# hours, Instagram CDN URLs much sooner.
+DEFAULT_TTLS = {
+    'youtube': 1800,
+    'instagram': 600,
+}
+
+
+def normalize_video_id(url, platform):
+    """Return the platform video ID for a URL, or None if it can't be found"""
+    if not url:
+        return None
+    pattern = YOUTUBE_ID_RE if platform == 'youtube' else INSTAGRAM_ID_RE
+    match = pattern.search(url)
+    return match.group(1) if match else None
+
+
+def cache_key(url, platform):
+    """Build the cache key for a URL, falling back to the URL itself"""
+    video_id = normalize_video_id(url, platform)
+    if video_id:
+        return f"{platform}:{video_id}"
+    return f"{platform}:url:{url.strip()}"
+
+
+class MetadataCache:
+    """Thread-safe LRU cache with per-platform TTLs"""
+
+    def __init__(self, max_entries=256, ttls=None, default_ttl=600):
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, url, platform):
+        """Return the cached entry for a URL or None on a miss"""
+        key = cache_key(url, platform)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, url, platform, value):
+        """Store a value for a URL, evicting the least recently used entries"""
+        key = cache_key(url, platform)
+        expires_at = time.monotonic() + self.ttls.get(platform, self.default_ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
@@ -0,0 +1,166 @@
+"""
+ffmpeg post-processing outside the download workers
+Merges and audio conversions are described by a PostprocessTask and run as
+ffmpeg child processes from their own worker pool, so CPU-bound work never
+holds a network download slot.
+"""
+
+import os
+import shutil
+import subprocess
+
+# yt-dlp audio codec names -> (file extension, ffmpeg encoder)
+AUDIO_CODECS = {
+    'mp3': ('mp3', 'libmp3lame'),
+    'aac': ('m4a', 'aac'),
+    'm4a': ('m4a', 'aac'),
+    'opus': ('opus', 'libopus'),
+    'vorbis': ('ogg', 'libvorbis'),
+    'flac': ('flac', 'flac'),
+    'wav': ('wav', 'pcm_s16le')
+}
+
+# Codec identifier prefixes as reported by yt-dlp -> codec family
+CODEC_FAMILIES = {
+    'avc1': 'h264', 'avc3': 'h264', 'h264': 'h264',
+    'hev1': 'hevc', 'hvc1': 'hevc', 'h265': 'hevc', 'hevc': 'hevc',
+    'av01': 'av1', 'av1': 'av1',
+    'vp09': 'vp9', 'vp9': 'vp9', 'vp8': 'vp8',
+    'mp4a': 'aac', 'aac': 'aac',
+    'opus': 'opus', 'vorbis': 'vorbis', 'mp3': 'mp3', 'flac': 'flac',
+    'ac-3': 'ac3', 'ac3': 'ac3', 'ec-3': 'eac3', 'eac3': 'eac3'
+}
+
+# Codec families each container can take without re-encoding, and the
+# (video, audio) encoders used for anything else
+CONTAINERS = {
+    'mp4': ({'h264', 'hevc', 'av1', 'vp9', 'aac', 'mp3', 'opus', 'flac', 'ac3', 'eac3'}, ('libx264', 'aac')),
+    'm4a': ({'aac', 'mp3', 'opus', 'flac', 'ac3', 'eac3'}, (None, 'aac')),
+    'mov': ({'h264', 'hevc', 'aac', 'mp3', 'ac3', 'eac3'}, ('libx264', 'aac')),
+    'webm': ({'vp8', 'vp9', 'av1', 'opus', 'vorbis'}, ('libvpx-vp9', 'libopus'))
+}
+
+
+def codec_family(codec):
+    """Return the family of a yt-dlp codec string ('avc1.64001F' -> 'h264'), or None"""
+    if not codec or codec == 'none':
+        return None
+    return CODEC_FAMILIES.get(codec.split('.')[0].lower())
+
+
+def can_copy(codec, container):
+    """Whether a stream can go into the container by stream copy
+
+    Unknown containers and codecs are assumed to fit, leaving ffmpeg to decide.
+    """
+    family = codec_family(codec)
+    if container not in CONTAINERS or family is None:
+        return True
+    return family in CONTAINERS[container][0]
+
+
+def can_copy_audio(acodec, preferred_codec):
+    """Whether an audio stream already is the codec an audio extraction asks for"""
+    family = codec_family(acodec)
+    return family is not None and family == {'m4a': 'aac'}.get(preferred_codec, preferred_codec)
+
+
+class FFmpegError(Exception):
+    """Raised when an ffmpeg run fails"""
+
+
+def ffmpeg_available():
+    return shutil.which('ffmpeg') is not None
+
+
+class PostprocessTask:
+    """The ffmpeg work left for a job once its streams are downloaded
+
+    kind is 'merge' (video and audio streams into one container) or
+    'extract_audio' (convert one stream to an audio-only file). inputs is a
+    list of (path, vcodec, acodec) tuples using yt-dlp's codec strings, with
+    None for a missing stream. Streams are copied whenever the output can
+    hold them as they are; only the rest is re-encoded.
+    """
+
+    def __init__(self, kind, inputs, output, duration=None, codec=None, quality=None, key=None):
+        self.kind = kind
+        self.inputs = inputs
+        self.output = output
+        self.duration = duration
+        self.codec = codec
+        self.quality = quality
+        self.key = key
+
+    def command(self, output):
+        """Return the ffmpeg argument list writing the result to `output`"""
+        args = ['ffmpeg', '-y', '-nostdin', '-loglevel', 'error', '-nostats', '-progress', 'pipe:1']
+        for path, _, _ in self.inputs:
+            args += ['-i', path]
+
+        container = os.path.splitext(self.output)[1].lstrip('.').lower()
+        if self.kind == 'merge':
+            video_index = audio_index = 0
+            for i, (_, vcodec, acodec) in enumerate(self.inputs):
+                if vcodec:
+                    args += ['-map', f'{i}:v:0', f'-c:v:{video_index}', self._encoder(vcodec, container, 0)]
+                    video_index += 1
+                if acodec:
+                    args += ['-map', f'{i}:a:0', f'-c:a:{audio_index}', self._encoder(acodec, container, 1)]
+                    audio_index += 1
+        elif self.kind == 'extract_audio':
+            if self.copy:
+                args += ['-vn', '-c:a', 'copy']
+            else:
+                args += ['-vn', '-c:a', AUDIO_CODECS[self.codec][1]]
+                if self.quality:
+                    args += ['-b:a', f'{self.quality}k']
+        else:
+            raise ValueError(f"Unknown postprocessing kind: {self.kind}")
+        if container in ('mp4', 'm4a', 'mov'):
+            args += ['-movflags', '+faststart']
+        return args + [output]
+
+    @staticmethod
+    def _encoder(codec, container, kind):
+        # kind is 0 for video, 1 for audio
+        if can_copy(codec, container):
+            return 'copy'
+        return CONTAINERS[container][1][kind] or 'copy'
+
+    @property
+    def copy(self):
+        """Whether this task only copies streams, with no decoding or encoding"""
+        if self.kind == 'extract_audio':
+            return can_copy_audio(self.inputs[0][2], self.codec)
+        container = os.path.splitext(self.output)[1].lstrip('.').lower()
+        return all(can_copy(codec, container) for _, vcodec, acodec in self.inputs
+                   for codec in (vcodec, acodec) if codec)
+
+    def run(self, progress_callback=None):
+        """Run ffmpeg, remove the inputs and return the output path
+
+        progress_callback is called with the percentage done whenever ffmpeg
+        reports progress and the media duration is known.
+        """
+        name, ext = os.path.splitext(self.output)
+        temp_output = f"{name}.temp{ext}"
+        process = subprocess.Popen(self.command(temp_output), stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, text=True)
+        for line in process.stdout:
+            key, _, value = line.strip().partition('=')
+            # out_time_us is in microseconds (despite the name, so is out_time_ms)
+            if key == 'out_time_us' and value.isdigit() and self.duration and progress_callback:
+                progress_callback(min(100.0, int(value) / 1e6 / self.duration * 100))
+        error = process.stderr.read()
+        if process.wait() != 0:
+            if os.path.exists(temp_output):
+                os.remove(temp_output)
+            raise FFmpegError(error.strip().splitlines()[-1] if error.strip() else
+                              f"ffmpeg exited with status {process.returncode}")
+
+        os.replace(temp_output, self.output)
+        for path, _, _ in self.inputs:
+            if os.path.abspath(path) != os.path.abspath(self.output) and os.path.exists(path):
+                os.remove(path)
+        return self.output
@@ -0,0 +1,436 @@
+"""
+Progress store for download jobs
+Keeps one compact record per job and expires finished jobs after a TTL.
+The in-memory store serves a single process; the SQLite store lets several
+worker processes share job state through one WAL-mode database file.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+FINISHED_STATUSES = ('completed', 'error')
+
+
+class JobRecord:
+    """Progress state of a single download job"""
+
+    __slots__ = ('status', 'percent', 'speed', 'eta', 'filepath', 'parts', 'version', 'updated_at')
+
+    def __init__(self):
+        self.status = 'unknown'
+        self.percent = 0
+        self.speed = ''
+        self.eta = 'Unknown'
+        self.filepath = None
+        self.parts = None
+        self.version = 0
+        self.updated_at = 0.0
+
+    def to_dict(self):
+        return progress_dict(self.status, self.percent, self.speed, self.eta, self.filepath, self.parts)
+
+    def size(self):
+        """Approximate memory used by this record in bytes"""
+        return (sys.getsizeof(self) + sys.getsizeof(self.status) + sys.getsizeof(self.percent)
+                + sys.getsizeof(self.speed) + sys.getsizeof(self.eta) + sys.getsizeof(self.filepath)
+                + sys.getsizeof(self.parts))
+
+
+def progress_dict(status, percent, speed, eta, filepath=None, parts=None):
+    """Client-facing progress dict; only the file's name is exposed, never its path
+
+    `parts` maps the name of each stream fetched in parallel (e.g. 'video',
+    'audio') to its own percentage; `percent` is their combined progress.
+    """
+    progress = {
+        'status': status,
+        'percent': percent,
+        'speed': speed,
+        'eta': eta
+    }
+    if filepath:
+        progress['filename'] = os.path.basename(filepath)
+    if parts:
+        progress['parts'] = parts
+    return progress
+
+
+class InMemoryProgressStore:
+    """Bounded, expiring job progress store for a single process"""
+
+    def __init__(self, max_entries=10000, finished_ttl=3600, max_batches=1000):
+        self.max_entries = max_entries
+        self.finished_ttl = finished_ttl
+        self.max_batches = max_batches
+        self._records = OrderedDict()
+        self._batches = OrderedDict()  # batch_id -> tuple of (job_id, url)
+        self._finished = OrderedDict()  # job_id -> finish time, oldest first
+        self._claims = {}  # dedup key -> job_id of the active job producing it
+        self._cond = threading.Condition()
+        self.expired = 0
+        self.evicted = 0
+
+    def update(self, job_id, status, percent=0, speed='', eta='', filepath=None, parts=None):
+        """Replace a job's progress and wake anyone waiting on it"""
+        now = time.monotonic()
+        with self._cond:
+            record = self._records.get(job_id)
+            if record is None:
+                record = self._records[job_id] = JobRecord()
+            record.status = status
+            record.percent = percent
+            record.speed = speed
+            record.eta = eta
+            record.filepath = filepath
+            record.parts = parts
+            record.version += 1
+            record.updated_at = now
+            if status in FINISHED_STATUSES:
+                self._finished[job_id] = now
+                self._finished.move_to_end(job_id)
+            else:
+                self._finished.pop(job_id, None)
+            self._evict(now)
+            self._cond.notify_all()
+
+    def get(self, job_id):
+        """Return a job's progress as a dict, or None if it is unknown"""
+        with self._cond:
+            record = self._records.get(job_id)
+            return record.to_dict() if record else None
+
+    def get_file(self, job_id):
+        """Return the path of a finished job's output file, if any"""
+        with self._cond:
+            record = self._records.get(job_id)
+            return record.filepath if record else None
+
+    def remove(self, job_id):
+        with self._cond:
+            self._records.pop(job_id, None)
+            self._finished.pop(job_id, None)
+            self._cond.notify_all()
+
+    def claim(self, key, job_id):
+        """Make job_id the owner of key unless an unfinished job already owns it
+
+        Returns the owning job's ID, which is job_id if the claim succeeded.
+        """
+        with self._cond:
+            owner = self._claims.get(key)
+            if owner is not None and owner != job_id:
+                record = self._records.get(owner)
+                if record is not None and record.status not in FINISHED_STATUSES:
+                    return owner
+            self._claims[key] = job_id
+            return job_id
+
+    def release(self, key, job_id):
+        with self._cond:
+            if self._claims.get(key) == job_id:
+                del self._claims[key]
+
+    def add_batch(self, batch_id, items):
+        """Record the (job_id, url) items that make up a batch"""
+        with self._cond:
+            self._batches[batch_id] = tuple(items)
+            while len(self._batches) > self.max_batches:
+                self._batches.popitem(last=False)
+
+    def get_batch(self, batch_id):
+        """Return a batch's (job_id, url) items, or None once all its jobs are gone"""
+        with self._cond:
+            items = self._batches.get(batch_id)
+            if items and not any(job_id in self._records for job_id, _ in items):
+                del self._batches[batch_id]
+                items = None
+            return list(items) if items else None
+
+    def wait_for_change(self, job_id, version, timeout):
+        """Block until a job's version differs from `version` or the timeout passes"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._version(job_id) != version, timeout=timeout)
+            return self._version(job_id)
+
+    def _version(self, job_id):
+        record = self._records.get(job_id)
+        return record.version if record else None
+
+    def _evict(self, now):
+        # Finished jobs expire in the order they finished
+        while self._finished:
+            job_id, finished_at = next(iter(self._finished.items()))
+            if now - finished_at < self.finished_ttl:
+                break
+            del self._finished[job_id]
+            del self._records[job_id]
+            self.expired += 1
+
+        # Enforce the hard cap, dropping finished jobs before active ones
+        while len(self._records) > self.max_entries:
+            if self._finished:
+                job_id, _ = self._finished.popitem(last=False)
+                del self._records[job_id]
+            else:
+                self._records.popitem(last=False)
+            self.evicted += 1
+
+    def stats(self):
+        with self._cond:
+            self._evict(time.monotonic())
+            return {
+                'backend': 'memory',
+                'entries': len(self._records),
+                'finished': len(self._finished),
+                'batches': len(self._batches),
+                'max_entries': self.max_entries,
+                'finished_ttl': self.finished_ttl,
+                'expired': self.expired,
+                'evicted': self.evicted,
+                'memory_bytes': (sys.getsizeof(self._records) + sys.getsizeof(self._finished)
+                                 + sum(sys.getsizeof(job_id) + record.size()
+                                       for job_id, record in self._records.items()))
+            }
+
+
+class SQLiteProgressStore:
+    """Job progress store shared between processes through a SQLite database"""
+
+    def __init__(self, path, max_entries=10000, finished_ttl=3600,
+                 min_update_interval=0.25, poll_interval=0.25, sweep_interval=30):
+        self.path = path
+        self.max_entries = max_entries
+        self.finished_ttl = finished_ttl
+        self.min_update_interval = min_update_interval
+        self.poll_interval = poll_interval
+        self.sweep_interval = sweep_interval
+        self._local = threading.local()
+        self._cond = threading.Condition()
+        self._last_write = {}
+        self._last_sweep = 0.0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                percent REAL NOT NULL DEFAULT 0,
+                speed TEXT NOT NULL DEFAULT '',
+                eta TEXT NOT NULL DEFAULT '',
+                version INTEGER NOT NULL DEFAULT 1,
+                updated_at REAL NOT NULL,
+                finished_at REAL,
+                filepath TEXT,
+                parts TEXT
+            )
+        """)
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(jobs)')]
+        if 'filepath' not in columns:
+            conn.execute('ALTER TABLE jobs ADD COLUMN filepath TEXT')
+        if 'parts' not in columns:
+            conn.execute('ALTER TABLE jobs ADD COLUMN parts TEXT')
+        conn.execute('CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at)')
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS batch_items (
+                batch_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                job_id TEXT NOT NULL,
+                url TEXT NOT NULL,
+                PRIMARY KEY (batch_id, position)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS claims (
+                key TEXT PRIMARY KEY,
+                job_id TEXT NOT NULL
+            )
+        """)
+
+    def _conn(self):
+        # sqlite3 connections can't be shared between threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def update(self, job_id, status, percent=0, speed='', eta='', filepath=None, parts=None):
+        """Replace a job's progress and wake anyone waiting on it"""
+        now = time.time()
+        with self._cond:
+            # Progress hooks fire many times a second; only persist a sample of them
+            if status == 'downloading':
+                last = self._last_write.get(job_id)
+                if last and last[0] == status and now - last[1] < self.min_update_interval:
+                    return
+            if status in FINISHED_STATUSES:
+                self._last_write.pop(job_id, None)
+            else:
+                self._last_write[job_id] = (status, now)
+
+        finished_at = now if status in FINISHED_STATUSES else None
+        self._conn().execute("""
+            INSERT INTO jobs (job_id, status, percent, speed, eta, version, updated_at, finished_at, filepath, parts)
+            VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?, ?)
+            ON CONFLICT (job_id) DO UPDATE SET
+                status = excluded.status,
+                percent = excluded.percent,
+                speed = excluded.speed,
+                eta = excluded.eta,
+                version = jobs.version + 1,
+                updated_at = excluded.updated_at,
+                finished_at = excluded.finished_at,
+                filepath = excluded.filepath,
+                parts = excluded.parts
+        """, (job_id, status, percent, speed, eta, now, finished_at, filepath,
+              json.dumps(parts) if parts else None))
+
+        if now - self._last_sweep >= self.sweep_interval:
+            self._last_sweep = now
+            self._evict(now)
+
+        with self._cond:
+            self._cond.notify_all()
+
+    def get(self, job_id):
+        """Return a job's progress as a dict, or None if it is unknown"""
+        row = self._conn().execute(
+            'SELECT status, percent, speed, eta, filepath, parts FROM jobs WHERE job_id = ?', (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return progress_dict(*row[:5], parts=json.loads(row[5]) if row[5] else None)
+
+    def get_file(self, job_id):
+        """Return the path of a finished job's output file, if any"""
+        row = self._conn().execute('SELECT filepath FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def remove(self, job_id):
+        self._conn().execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+        with self._cond:
+            self._last_write.pop(job_id, None)
+            self._cond.notify_all()
+
+    def claim(self, key, job_id):
+        """Make job_id the owner of key unless an unfinished job already owns it
+
+        Returns the owning job's ID, which is job_id if the claim succeeded.
+        """
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute("""
+                SELECT claims.job_id FROM claims
+                JOIN jobs ON jobs.job_id = claims.job_id
+                WHERE claims.key = ? AND jobs.finished_at IS NULL
+            """, (key,)).fetchone()
+            if row and row[0] != job_id:
+                owner = row[0]
+            else:
+                conn.execute('INSERT OR REPLACE INTO claims (key, job_id) VALUES (?, ?)', (key, job_id))
+                owner = job_id
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return owner
+
+    def release(self, key, job_id):
+        self._conn().execute('DELETE FROM claims WHERE key = ? AND job_id = ?', (key, job_id))
+
+    def add_batch(self, batch_id, items):
+        """Record the (job_id, url) items that make up a batch"""
+        conn = self._conn()
+        conn.execute('BEGIN')
+        conn.executemany(
+            'INSERT OR REPLACE INTO batch_items (batch_id, position, job_id, url) VALUES (?, ?, ?, ?)',
+            [(batch_id, position, job_id, url) for position, (job_id, url) in enumerate(items)]
+        )
+        conn.execute('COMMIT')
+
+    def get_batch(self, batch_id):
+        """Return a batch's (job_id, url) items, or None if the batch is unknown"""
+        rows = self._conn().execute(
+            'SELECT job_id, url FROM batch_items WHERE batch_id = ? ORDER BY position', (batch_id,)
+        ).fetchall()
+        return [tuple(row) for row in rows] or None
+
+    def wait_for_change(self, job_id, version, timeout):
+        """Block until a job's version differs from `version` or the timeout passes
+
+        Local updates wake the waiter immediately; updates written by other
+        processes are picked up by polling every `poll_interval` seconds.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            current = self._version(job_id)
+            remaining = deadline - time.monotonic()
+            if current != version or remaining <= 0:
+                return current
+            with self._cond:
+                self._cond.wait(min(self.poll_interval, remaining))
+
+    def _version(self, job_id):
+        row = self._conn().execute('SELECT version FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def _evict(self, now):
+        conn = self._conn()
+        conn.execute('DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?',
+                     (now - self.finished_ttl,))
+        conn.execute('DELETE FROM claims WHERE job_id NOT IN (SELECT job_id FROM jobs)')
+        conn.execute("""
+            DELETE FROM batch_items WHERE batch_id NOT IN (
+                SELECT DISTINCT batch_id FROM batch_items JOIN jobs USING (job_id)
+            )
+        """)
+        count = conn.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+        if count > self.max_entries:
+            # Drop finished jobs before active ones, oldest first
+            conn.execute("""
+                DELETE FROM jobs WHERE job_id IN (
+                    SELECT job_id FROM jobs
+                    ORDER BY finished_at IS NULL, COALESCE(finished_at, updated_at)
+                    LIMIT ?
+                )
+            """, (count - self.max_entries,))
+
+    def stats(self):
+        now = time.time()
+        self._evict(now)
+        conn = self._conn()
+        entries, finished = conn.execute(
+            'SELECT COUNT(*), COUNT(finished_at) FROM jobs'
+        ).fetchone()
+        batches = conn.execute('SELECT COUNT(DISTINCT batch_id) FROM batch_items').fetchone()[0]
+        page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        return {
+            'backend': 'sqlite',
+            'entries': entries,
+            'finished': finished,
+            'batches': batches,
+            'max_entries': self.max_entries,
+            'finished_ttl': self.finished_ttl,
+            'db_bytes': page_count * page_size
+        }
+
+
+def create_progress_store(backend='memory', **kwargs):
+    """Build the progress store selected by name ('memory' or 'sqlite')"""
+    if backend == 'memory':
+        kwargs.pop('path', None)
+        return InMemoryProgressStore(**kwargs)
+    if backend == 'sqlite':
+        return SQLiteProgressStore(**kwargs)
+    raise ValueError(f"Unknown progress store backend: {backend}")
@@ -0,0 +1,250 @@
+"""
+Multi-connection segmented HTTP downloader
+Splits a file into byte ranges fetched in parallel and writes each range
+straight into its place in a preallocated file. Completed ranges are noted
+next to the file, so an interrupted download resumes where it stopped.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+
+class RangeNotSupported(Exception):
+    """Raised when a server doesn't honour byte-range requests"""
+
+
+class HostLimiter:
+    """Caps the number of simultaneous connections made to each host"""
+
+    def __init__(self, max_per_host=8):
+        self.max_per_host = max_per_host
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = self._semaphores[host] = threading.BoundedSemaphore(self.max_per_host)
+        semaphore.acquire()
+        return semaphore
+
+
+# Shared by all downloads in the process so the cap holds across jobs
+default_host_limiter = HostLimiter(int(os.environ.get('MAX_CONNECTIONS_PER_HOST', 8)))
+
+
+def probe_size(url, headers=None, session=None):
+    """Return the size of a range-capable resource, or raise RangeNotSupported"""
+    session = session or requests
+    response = session.get(url, headers=dict(headers or {}, Range='bytes=0-0'), stream=True, timeout=30)
+    try:
+        if response.status_code == 200:
+            raise RangeNotSupported(f"{url} does not support range requests")
+        # Other errors (403, 429, 5xx...) may be transient; leave them to the caller's retries
+        response.raise_for_status()
+        content_range = response.headers.get('Content-Range', '')
+        if response.status_code != 206 or '/' not in content_range:
+            raise RangeNotSupported(f"{url} does not support range requests")
+        total = content_range.rsplit('/', 1)[1]
+        if not total.isdigit():
+            raise RangeNotSupported(f"{url} did not report its size")
+        return int(total)
+    finally:
+        response.close()
+
+
+def preallocate(path, size):
+    """Create a file of the given size so segments can be written in place"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'wb') as f:
+        if size:
+            if hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(f.fileno(), 0, size)
+            else:
+                f.truncate(size)
+
+
+class SegmentedDownload:
+    """Download one URL over several connections
+
+    Segments are handed out from a shared queue, so fast connections pick up
+    more of the file. A failed segment is retried from the last byte written.
+    Finished segments are recorded in `state_path`; a later run with the same
+    size and segment size only fetches the rest.
+    """
+
+    def __init__(self, url, path, headers=None, size=None, connections=4,
+                 segment_size=4 * 1024 * 1024, chunk_size=256 * 1024, retries=3,
+                 progress_callback=None, host_limiter=None, session=None):
+        self.url = url
+        self.path = path
+        self.headers = dict(headers or {})
+        self.size = size
+        self.connections = max(1, connections)
+        self.segment_size = segment_size
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.progress_callback = progress_callback
+        self.host_limiter = host_limiter or default_host_limiter
+        self.session = session or requests.Session()
+        self.downloaded = 0
+        self.resumed_bytes = 0
+        self._done = set()
+        self._lock = threading.Lock()
+        self._errors = []
+        self._started = None
+
+    @property
+    def part_path(self):
+        # Distinct from yt-dlp's own '.part' files, which it would try to resume
+        return self.path + '.seg.part'
+
+    @property
+    def state_path(self):
+        return self.path + '.seg.json'
+
+    def _load_state(self):
+        """Return the starts of segments finished by an earlier run, if they still apply"""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return set()
+        if (state.get('size') != self.size or state.get('segment_size') != self.segment_size
+                or not os.path.exists(self.part_path) or os.path.getsize(self.part_path) != self.size):
+            return set()
+        return set(state.get('done', []))
+
+    def _save_state(self):
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'size': self.size, 'segment_size': self.segment_size, 'done': sorted(self._done)}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _remove_state(self):
+        for path in (self.state_path, self.part_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def run(self):
+        """Download the file to self.path and return the path"""
+        if self.size is None:
+            self.size = probe_size(self.url, self.headers, self.session)
+
+        self._started = time.monotonic()
+        self._done = self._load_state()
+        if not self._done:
+            preallocate(self.part_path, self.size)
+
+        segments = queue.Queue()
+        for start in range(0, self.size, self.segment_size):
+            end = min(start + self.segment_size, self.size) - 1
+            if start in self._done:
+                self.resumed_bytes += end + 1 - start
+            else:
+                segments.put((start, end))
+        self.downloaded = self.resumed_bytes
+
+        workers = [
+            threading.Thread(target=self._worker, args=(segments,), daemon=True)
+            for _ in range(min(self.connections, segments.qsize()))
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        if self._errors:
+            if isinstance(self._errors[0], RangeNotSupported):
+                self._remove_state()
+            raise self._errors[0]
+        os.replace(self.part_path, self.path)
+        self._remove_state()
+        return self.path
+
+    def _worker(self, segments):
+        with open(self.part_path, 'r+b') as f:
+            while not self._errors:
+                try:
+                    start, end = segments.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    self._fetch_segment(f, start, end)
+                except Exception as e:
+                    self._errors.append(e)
+                    return
+                f.flush()
+                with self._lock:
+                    self._done.add(start)
+                    self._save_state()
+
+    def _fetch_segment(self, f, start, end):
+        # cursor[0] is the next byte to write; _fetch_range advances it as data
+        # lands, so a dropped connection is retried from where it stopped
+        cursor = [start]
+        for attempt in range(self.retries + 1):
+            try:
+                self._fetch_range(f, cursor, end)
+                if cursor[0] > end:
+                    return
+                error = IOError(f"Connection closed at byte {cursor[0]} of segment {start}-{end}")
+            except (requests.RequestException, IOError) as e:
+                error = e
+            if attempt == self.retries:
+                raise error
+            time.sleep(min(2 ** attempt, 10))
+
+    def _fetch_range(self, f, cursor, end):
+        """Write bytes cursor[0]..end at their offset, advancing cursor[0] past each chunk"""
+        semaphore = self.host_limiter.acquire(self.url)
+        try:
+            headers = dict(self.headers, Range=f"bytes={cursor[0]}-{end}")
+            with self.session.get(self.url, headers=headers, stream=True, timeout=30) as response:
+                if response.status_code == 200:
+                    raise RangeNotSupported("Server ignored the range request and sent the whole file")
+                response.raise_for_status()
+                if response.status_code != 206:
+                    raise RangeNotSupported(f"Expected 206 for a range request, got {response.status_code}")
+                f.seek(cursor[0])
+                for chunk in response.iter_content(self.chunk_size):
+                    chunk = chunk[:end + 1 - cursor[0]]
+                    f.write(chunk)
+                    cursor[0] += len(chunk)
+                    self._report(len(chunk))
+                    if cursor[0] > end:
+                        break
+        finally:
+            semaphore.release()
+
+    def _report(self, count):
+        with self._lock:
+            self.downloaded += count
+            downloaded = self.downloaded
+        if self.progress_callback:
+            elapsed = time.monotonic() - self._started
+            speed = (downloaded - self.resumed_bytes) / elapsed if elapsed > 0 else None
+            eta = (self.size - downloaded) / speed if speed else None
+            self.progress_callback({
+                'status': 'downloading',
+                'downloaded_bytes': downloaded,
+                'total_bytes': self.size,
+                'speed': speed,
+                'eta': int(eta) if eta is not None else None,
+                'filename': self.path
+            })
+
+
+def segmented_download(url, path, **kwargs):
+    """Download url to path over several connections; see SegmentedDownload"""
+    return SegmentedDownload(url, path, **kwargs).run()
@@ -0,0 +1,169 @@
+"""
+Pool of reusable yt-dlp sessions
+Creating a YoutubeDL sets up the extractor registry, cookie jar and HTTP
+request handlers, which takes around a tenth of a second. Pooled instances
+pay that once and are lent out with each request's options applied on top.
+yt-dlp itself is imported when the first session is created, not with this
+module.
+"""
+
+import importlib
+import threading
+from contextlib import contextmanager
+
+HOOK_OPTIONS = {
+    'progress_hooks': 'add_progress_hook',
+    'post_hooks': 'add_post_hook',
+    'postprocessor_hooks': 'add_postprocessor_hook'
+}
+
+# yt-dlp extractors handling each supported platform's URLs, as
+# (module, class names) in the order yt-dlp itself tries them
+PLATFORM_EXTRACTORS = {
+    'youtube': ('yt_dlp.extractor.youtube', (
+        'YoutubeIE', 'YoutubeClipIE', 'YoutubeFavouritesIE', 'YoutubeNotificationsIE', 'YoutubeHistoryIE',
+        'YoutubeTabIE', 'YoutubeLivestreamEmbedIE', 'YoutubePlaylistIE', 'YoutubeRecommendedIE',
+        'YoutubeSearchDateIE', 'YoutubeSearchIE', 'YoutubeSearchURLIE', 'YoutubeMusicSearchURLIE',
+        'YoutubeSubscriptionsIE', 'YoutubeTruncatedIDIE', 'YoutubeTruncatedURLIE', 'YoutubeYtBeIE',
+        'YoutubeYtUserIE', 'YoutubeWatchLaterIE', 'YoutubeShortsAudioPivotIE', 'YoutubeConsentRedirectIE'
+    )),
+    'instagram': ('yt_dlp.extractor.instagram', (
+        'InstagramIE', 'InstagramIOSIE', 'InstagramUserIE', 'InstagramTagIE', 'InstagramStoryIE'
+    ))
+}
+
+
+def load_extractors(specs):
+    """Return the extractor classes named by (module, class names) specs
+
+    Only those modules are imported, not yt-dlp's registry of every site.
+    Names missing from the installed yt-dlp are skipped.
+    """
+    classes = []
+    for module_name, names in specs:
+        module = importlib.import_module(module_name)
+        classes += [getattr(module, name) for name in names if hasattr(module, name)]
+    return classes
+
+
+class SessionPool:
+    """Idle YoutubeDL instances built from one set of base options
+
+    A session is used by one thread at a time. Per-request options are
+    applied when it is lent out and undone when it comes back; options that
+    yt-dlp only reads while constructing an instance (cookies, proxy, HTTP
+    headers, logging) belong in the base options.
+
+    With `extractors` (a list of PLATFORM_EXTRACTORS values) sessions only
+    know those extractors, which skips loading the full registry and makes
+    URL matching try a handful of extractors instead of every site.
+    """
+
+    def __init__(self, base_options=None, max_idle=4, max_uses=200, extractors=None):
+        self.base_options = dict(base_options or {})
+        self.max_idle = max_idle
+        self.max_uses = max_uses
+        self.extractors = extractors
+        self._extractor_classes = None
+        self._idle = []  # (ydl, uses), most recently returned last
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    @contextmanager
+    def session(self, options=None):
+        """Lend out a YoutubeDL with `options` applied for the duration of the block"""
+        with self._lock:
+            ydl, uses = self._idle.pop() if self._idle else (None, 0)
+            if ydl is None:
+                self.created += 1
+            else:
+                self.reused += 1
+        if ydl is None:
+            ydl = self._create()
+
+        saved = apply_options(ydl, options or {})
+        try:
+            yield ydl
+        finally:
+            restore_options(ydl, saved)
+            uses += 1
+            with self._lock:
+                keep = uses < self.max_uses and len(self._idle) < self.max_idle
+                if keep:
+                    self._idle.append((ydl, uses))
+            if not keep:
+                ydl.close()
+
+    def _create(self):
+        import yt_dlp
+        if self.extractors is None:
+            return yt_dlp.YoutubeDL(dict(self.base_options))
+        if self._extractor_classes is None:
+            self._extractor_classes = load_extractors(self.extractors)
+        ydl = yt_dlp.YoutubeDL(dict(self.base_options), auto_init=False)
+        for ie in self._extractor_classes:
+            ydl.add_info_extractor(ie())
+        return ydl
+
+    def prefill(self, count=1):
+        """Create sessions until `count` are idle, so early requests don't build their own"""
+        while True:
+            with self._lock:
+                if len(self._idle) >= min(count, self.max_idle):
+                    return
+                self.created += 1
+            ydl = self._create()
+            with self._lock:
+                self._idle.append((ydl, 0))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'idle': len(self._idle),
+                'max_idle': self.max_idle,
+                'extractors': 'all' if self.extractors is None else len(self._extractor_classes or ()),
+                'created': self.created,
+                'reused': self.reused
+            }
+
+
+def apply_options(ydl, options):
+    """Apply per-request options to a YoutubeDL and return what's needed to undo them"""
+    from yt_dlp.postprocessor import get_postprocessor
+
+    saved = (
+        dict(ydl.params),
+        ydl.format_selector,
+        {name: list(getattr(ydl, '_' + name)) for name in HOOK_OPTIONS},
+        {when: list(pps) for when, pps in ydl._pps.items()}
+    )
+
+    params = dict(options)
+    hooks = {name: params.pop(name, []) for name in HOOK_OPTIONS}
+    postprocessors = params.pop('postprocessors', [])
+    if 'outtmpl' in params and not isinstance(params['outtmpl'], dict):
+        params['outtmpl'] = dict(ydl.params['outtmpl'], default=params['outtmpl'])
+
+    ydl.params.update(params)
+    if params.get('format') not in (None, '-'):
+        ydl.format_selector = ydl.build_format_selector(params['format'])
+    for name, functions in hooks.items():
+        for function in functions:
+            getattr(ydl, HOOK_OPTIONS[name])(function)
+    # Same construction as YoutubeDL.__init__ uses for its 'postprocessors' option
+    for pp_def in postprocessors:
+        pp_def = dict(pp_def)
+        when = pp_def.pop('when', 'post_process')
+        ydl.add_post_processor(get_postprocessor(pp_def.pop('key'))(ydl, **pp_def), when=when)
+    return saved
+
+
+def restore_options(ydl, saved):
+    params, format_selector, hooks, pps = saved
+    ydl.params.clear()
+    ydl.params.update(params)
+    ydl.format_selector = format_selector
+    for name, functions in hooks.items():
+        setattr(ydl, '_' + name, functions)
+    ydl._pps = pps
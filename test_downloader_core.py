@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test script for the downloader core
+Runs on hand-written yt-dlp format lists, without Flask, Kivy or network access
+"""
+
+import sys
+
+from downloader_core import FormatIndex, format_duration, format_options, format_views, youtube_summary
+
+FORMATS = [
+    {'format_id': 'sb0', 'ext': 'mhtml', 'vcodec': 'none', 'acodec': 'none'},
+    {'format_id': '139', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a.40.5', 'abr': 48.8},
+    {'format_id': '251', 'ext': 'webm', 'vcodec': 'none', 'acodec': 'opus', 'abr': 129.5},
+    {'format_id': '140', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a.40.2', 'abr': 129.5},
+    {'format_id': '160', 'ext': 'mp4', 'vcodec': 'avc1.4d400c', 'acodec': 'none', 'height': 144},
+    {'format_id': '18', 'ext': 'mp4', 'vcodec': 'avc1.42001E', 'acodec': 'mp4a.40.2', 'height': 360},
+    {'format_id': '134', 'ext': 'mp4', 'vcodec': 'avc1.4d401e', 'acodec': 'none', 'height': 360},
+    {'format_id': '248', 'ext': 'webm', 'vcodec': 'vp9', 'acodec': 'none', 'height': 1080, 'filesize': 900},
+    {'format_id': '137', 'ext': 'mp4', 'vcodec': 'avc1.640028', 'acodec': 'none', 'height': 1080, 'filesize': 1000},
+    {'format_id': '303', 'ext': 'webm', 'vcodec': 'vp9', 'acodec': 'none', 'height': 1440}
+]
+
+
+def test_video_formats_include_video_only():
+    formats = FormatIndex(FORMATS).video_formats()
+    assert [(fmt['quality'], fmt['format_id'], fmt['has_audio']) for fmt in formats] == [
+        ('1440p', '303', False),
+        ('1080p', '137', False),
+        ('360p', '18', True)
+    ], formats
+
+
+def test_audio_formats_one_per_bitrate():
+    formats = FormatIndex(FORMATS).audio_formats()
+    assert [(fmt['quality'], fmt['format_id']) for fmt in formats] == [
+        ('129kbps', '140'),
+        ('48kbps', '139')
+    ], formats
+
+
+def test_format_options_pick_listed_stream():
+    index = FormatIndex(FORMATS)
+    # A video-only height is merged with the best mp4-friendly audio stream
+    video = format_options('youtube', '1080p (video only)', 'video', index)
+    assert video['format'].split('/')[0] == '137+140', video
+    assert video['merge_output_format'] == 'mp4'
+    assert format_options('youtube', '360p (with audio)', 'video', index)['format'].split('/')[0] == '18'
+    audio = format_options('youtube', '48kbps (m4a)', 'audio', index)
+    assert audio['format'].split('/')[0] == '139', audio
+    assert audio['postprocessors'][0]['preferredcodec'] == 'mp3'
+
+
+def test_summary_and_text():
+    summary = youtube_summary({'title': 'Test', 'duration': 3725.0, 'view_count': 1_250_000,
+                               'formats': FORMATS}, 'https://youtu.be/x')
+    assert summary['duration'] == '01:02:05'
+    assert summary['views'] == '1.2M'
+    assert len(summary['video_formats']) == 3
+    assert format_duration(0) == 'Unknown'
+    assert format_views(999) == '999'
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Downloader Core Tests")
+    print("=" * 40)
+
+    failed = False
+    for test in (test_video_formats_include_video_only,
+                 test_audio_formats_one_per_bitrate,
+                 test_format_options_pick_listed_stream,
+                 test_summary_and_text):
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e}")
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
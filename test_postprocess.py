@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Test script for ffmpeg post-processing
+Checks which streams are copied and the ffmpeg commands built for them,
+without running ffmpeg
+"""
+
+import sys
+
+from postprocess import PostprocessTask, can_copy, can_copy_audio
+
+# (codec, container, expected can_copy)
+CAN_COPY_CASES = [
+    ('avc1.640028', 'mp4', True),
+    ('vp09.00.40.08', 'mp4', True),
+    ('mp4a.40.2', 'mp4', True),
+    ('opus', 'mp4', True),
+    ('vorbis', 'mp4', False),
+    ('vp9', 'mov', False),
+    ('opus', 'mov', False),
+    ('avc1.640028', 'webm', False),
+    ('vorbis', 'webm', True),
+    ('mp4a.40.2', 'm4a', True),
+    ('unknown.1', 'mp4', True),
+    ('avc1.640028', 'mkv', True),
+    ('none', 'mp4', True)
+]
+
+# (source acodec, preferred codec, expected can_copy_audio)
+CAN_COPY_AUDIO_CASES = [
+    ('mp4a.40.2', 'm4a', True),
+    ('mp4a.40.2', 'aac', True),
+    ('opus', 'mp3', False),
+    ('opus', 'opus', True),
+    ('mp3', 'mp3', True),
+    ('mp4a.40.2', 'mp3', False),
+    (None, 'mp3', False),
+    ('none', 'm4a', False)
+]
+
+
+def codec_args(args):
+    """The stream mapping and codec arguments of an ffmpeg command, in order"""
+    start = args.index('-map')
+    end = args.index('-movflags') if '-movflags' in args else len(args) - 1
+    return args[start:end]
+
+
+def test_can_copy_table():
+    for codec, container, expected in CAN_COPY_CASES:
+        assert can_copy(codec, container) is expected, (codec, container)
+
+
+def test_can_copy_audio_table():
+    for acodec, preferred, expected in CAN_COPY_AUDIO_CASES:
+        assert can_copy_audio(acodec, preferred) is expected, (acodec, preferred)
+
+
+def test_aac_to_m4a_is_a_copy():
+    task = PostprocessTask('extract_audio', [('in.m4a', None, 'mp4a.40.2')], 'out.m4a', codec='m4a', quality='192')
+    assert task.copy
+    args = task.command('tmp.m4a')
+    assert args[args.index('-vn'):] == ['-vn', '-c:a', 'copy', '-movflags', '+faststart', 'tmp.m4a']
+
+
+def test_opus_to_mp3_is_an_encode():
+    task = PostprocessTask('extract_audio', [('in.webm', None, 'opus')], 'out.mp3', codec='mp3', quality='192')
+    assert not task.copy
+    args = task.command('tmp.mp3')
+    assert args[args.index('-vn'):] == ['-vn', '-c:a', 'libmp3lame', '-b:a', '192k', 'tmp.mp3']
+
+
+def test_vp9_and_aac_into_mp4_is_all_copy():
+    task = PostprocessTask('merge', [('v.webm', 'vp09.00.40.08', None), ('a.m4a', None, 'mp4a.40.2')], 'out.mp4')
+    assert task.copy
+    assert codec_args(task.command('tmp.mp4')) == [
+        '-map', '0:v:0', '-c:v:0', 'copy',
+        '-map', '1:a:0', '-c:a:0', 'copy'
+    ]
+
+
+def test_vorbis_into_mp4_encodes_audio_only():
+    task = PostprocessTask('merge', [('v.webm', 'vp9', None), ('a.webm', None, 'vorbis')], 'out.mp4')
+    assert not task.copy
+    assert codec_args(task.command('tmp.mp4')) == [
+        '-map', '0:v:0', '-c:v:0', 'copy',
+        '-map', '1:a:0', '-c:a:0', 'aac'
+    ]
+
+
+def test_stream_indexes_count_per_type():
+    # A muxed input followed by a second audio track: the audio codec
+    # options address output streams a:0 and a:1, not the input index
+    task = PostprocessTask('merge', [('av.mp4', 'avc1.640028', 'mp4a.40.2'), ('a.webm', None, 'opus')], 'out.webm')
+    args = task.command('tmp.webm')
+    assert codec_args(args) == [
+        '-map', '0:v:0', '-c:v:0', 'libvpx-vp9',
+        '-map', '0:a:0', '-c:a:0', 'libopus',
+        '-map', '1:a:0', '-c:a:1', 'copy'
+    ]
+    assert args[:9] == ['ffmpeg', '-y', '-nostdin', '-loglevel', 'error', '-nostats', '-progress', 'pipe:1', '-i']
+    assert '-movflags' not in args and args[-1] == 'tmp.webm'
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Postprocessing Tests")
+    print("=" * 40)
+
+    failed = False
+    for test in (test_can_copy_table,
+                 test_can_copy_audio_table,
+                 test_aac_to_m4a_is_a_copy,
+                 test_opus_to_mp3_is_an_encode,
+                 test_vp9_and_aac_into_mp4_is_all_copy,
+                 test_vorbis_into_mp4_encodes_audio_only,
+                 test_stream_indexes_count_per_type):
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e}")
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Test script for job progress stores and the download scheduler
+Two SQLite store instances on one database file stand in for two worker
+processes sharing job state
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from download_scheduler import DownloadScheduler, QueueFullError
+from progress_store import InMemoryProgressStore, SQLiteProgressStore
+
+
+def sqlite_stores(tmp, **kwargs):
+    path = os.path.join(tmp, 'jobs.db')
+    return SQLiteProgressStore(path, **kwargs), SQLiteProgressStore(path, **kwargs)
+
+
+def test_sqlite_claim_is_shared_between_instances():
+    with tempfile.TemporaryDirectory() as tmp:
+        first, second = sqlite_stores(tmp)
+        first.update('job-1', 'queued')
+        assert first.claim('video', 'job-1') == 'job-1'
+        assert second.claim('video', 'job-2') == 'job-1'
+        assert second.claim('video', 'job-1') == 'job-1'
+
+        # Once the owner finishes, the key can be claimed again
+        first.update('job-1', 'completed', 100)
+        second.update('job-2', 'queued')
+        assert second.claim('video', 'job-2') == 'job-2'
+        assert first.claim('video', 'job-3') == 'job-2'
+
+        # Only the owner's release frees the key
+        first.release('video', 'job-3')
+        assert first.claim('video', 'job-3') == 'job-2'
+        second.release('video', 'job-2')
+        assert first.claim('video', 'job-3') == 'job-3'
+
+
+def test_sqlite_evicts_finished_jobs_first():
+    with tempfile.TemporaryDirectory() as tmp:
+        first, second = sqlite_stores(tmp, max_entries=3, sweep_interval=0)
+        for job_id, status in (('active-1', 'queued'), ('done-1', 'completed'),
+                               ('done-2', 'error'), ('active-2', 'queued')):
+            first.update(job_id, status)
+            time.sleep(0.01)
+        assert second.get('done-1') is None
+        assert second.get('done-2')['status'] == 'error'
+
+        second.update('active-3', 'queued')
+        time.sleep(0.01)
+        assert first.get('done-2') is None
+
+        # With no finished job left, the least recently updated active one goes
+        second.update('active-4', 'queued')
+        assert first.get('active-1') is None
+        assert [first.get(job_id)['status'] for job_id in ('active-2', 'active-3', 'active-4')] == ['queued'] * 3
+
+
+def test_sqlite_finished_jobs_expire():
+    with tempfile.TemporaryDirectory() as tmp:
+        first, second = sqlite_stores(tmp, finished_ttl=0.05)
+        first.update('job-1', 'completed', 100)
+        first.update('job-2', 'downloading', 50)
+        time.sleep(0.1)
+        assert second.stats()['entries'] == 1
+        assert first.get('job-1') is None
+        assert first.get('job-2')['percent'] == 50
+
+
+def test_sqlite_wait_for_change_sees_other_instance():
+    with tempfile.TemporaryDirectory() as tmp:
+        first, second = sqlite_stores(tmp, poll_interval=0.05)
+        first.update('job-1', 'queued')
+        version = second._version('job-1')
+
+        timer = threading.Timer(0.2, first.update, ('job-1', 'downloading', 10))
+        timer.start()
+        started = time.monotonic()
+        new_version = second.wait_for_change('job-1', version, timeout=5)
+        elapsed = time.monotonic() - started
+        timer.join()
+        assert new_version == version + 1
+        assert 0.1 < elapsed < 2
+        assert second.get('job-1')['percent'] == 10
+
+        # No change: returns the same version after the timeout
+        assert second.wait_for_change('job-1', new_version, timeout=0.1) == new_version
+
+
+def test_memory_store_claims_and_eviction():
+    store = InMemoryProgressStore(max_entries=3)
+    store.update('job-1', 'queued')
+    assert store.claim('video', 'job-1') == 'job-1'
+    assert store.claim('video', 'job-2') == 'job-1'
+    store.update('job-1', 'completed', 100)
+    assert store.claim('video', 'job-2') == 'job-2'
+
+    for job_id in ('job-2', 'job-3', 'job-4'):
+        store.update(job_id, 'queued')
+    assert store.get('job-1') is None and store.evicted == 1
+    store.update('job-5', 'queued')
+    assert store.get('job-2') is None and store.evicted == 2
+
+
+def test_memory_store_wait_for_change():
+    store = InMemoryProgressStore(finished_ttl=0.05)
+    store.update('job-1', 'queued')
+    version = store._version('job-1')
+    timer = threading.Timer(0.1, store.update, ('job-1', 'completed', 100))
+    timer.start()
+    assert store.wait_for_change('job-1', version, timeout=5) == version + 1
+    timer.join()
+    time.sleep(0.1)
+    assert store.stats()['entries'] == 0 and store.expired == 1
+
+
+def test_scheduler_runs_by_priority_then_fifo():
+    scheduler = DownloadScheduler(max_workers=1, max_queue=10)
+    gate = threading.Event()
+    order = []
+    scheduler.submit('blocker', gate.wait)
+    time.sleep(0.05)
+    for job_id, priority in (('batch-1', 1), ('single-1', 0), ('batch-2', 1), ('single-2', 0)):
+        scheduler.submit(job_id, lambda job_id=job_id: order.append(job_id), priority=priority)
+    assert scheduler.position('single-2') == 2
+    assert scheduler.position('batch-2') == 4
+    gate.set()
+    assert scheduler.wait(timeout=5)
+    assert order == ['single-1', 'single-2', 'batch-1', 'batch-2']
+    scheduler.shutdown()
+
+
+def test_scheduler_bounds_each_priority():
+    scheduler = DownloadScheduler(max_workers=1, max_queue=2)
+    gate = threading.Event()
+    scheduler.submit('blocker', gate.wait)
+    time.sleep(0.05)
+    scheduler.submit('single-1', lambda: None)
+    scheduler.submit('single-2', lambda: None)
+    try:
+        scheduler.submit('single-3', lambda: None)
+    except QueueFullError:
+        pass
+    else:
+        raise AssertionError('Expected QueueFullError')
+    assert scheduler.free_slots(priority=1, max_queue=1) == 1
+    scheduler.submit('batch-1', lambda: None, priority=1, max_queue=1)
+
+    assert scheduler.cancel('single-2')
+    assert not scheduler.cancel('blocker')
+    assert scheduler.shutdown(cancel_pending=True) == ['single-1', 'batch-1']
+    gate.set()
+    assert scheduler.wait(timeout=5)
+    stats = scheduler.stats()
+    assert stats['rejected'] == 1 and stats['completed'] == 1 and stats['closed']
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Progress Store and Scheduler Tests")
+    print("=" * 40)
+
+    failed = False
+    for test in (test_sqlite_claim_is_shared_between_instances,
+                 test_sqlite_evicts_finished_jobs_first,
+                 test_sqlite_finished_jobs_expire,
+                 test_sqlite_wait_for_change_sees_other_instance,
+                 test_memory_store_claims_and_eviction,
+                 test_memory_store_wait_for_change,
+                 test_scheduler_runs_by_priority_then_fifo,
+                 test_scheduler_bounds_each_priority):
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e}")
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
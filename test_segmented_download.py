@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Test script for the segmented downloader
+Runs against a local HTTP server that supports byte-range requests
+"""
+
+import os
+import sys
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+from segmented_download import HostLimiter, RangeNotSupported, SegmentedDownload, segmented_download
+
+PAYLOAD = os.urandom(3 * 1024 * 1024 + 123)
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves PAYLOAD, honouring a single 'Range: bytes=a-b' header"""
+
+    supports_ranges = True
+    drop_after = None  # close the next connection after this many body bytes
+    fail_request = None  # answer this request (1-based) with a 503
+    ranges = []
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+        try:
+            range_header = self.headers.get('Range')
+            cls.ranges.append(range_header)
+            if len(cls.ranges) == cls.fail_request:
+                self.send_response(503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if range_header and cls.supports_ranges:
+                start, end = range_header.split('=')[1].split('-')
+                start, end = int(start), min(int(end), len(PAYLOAD) - 1)
+                body = PAYLOAD[start:end + 1]
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{len(PAYLOAD)}')
+            else:
+                body = PAYLOAD
+                self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if cls.drop_after is not None and len(body) > cls.drop_after:
+                self.wfile.write(body[:cls.drop_after])
+                cls.drop_after = None
+                self.close_connection = True
+                return
+            self.wfile.write(body)
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/file.bin"
+
+
+def test_segmented_download_reassembles_file():
+    server, url = start_server()
+    updates = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'file.bin')
+            segmented_download(url, path, connections=4, segment_size=256 * 1024,
+                               progress_callback=updates.append)
+            with open(path, 'rb') as f:
+                assert f.read() == PAYLOAD
+            assert not os.path.exists(path + '.seg.part')
+    finally:
+        server.shutdown()
+    assert updates[-1]['downloaded_bytes'] == len(PAYLOAD)
+
+
+def test_host_limiter_caps_connections():
+    RangeHandler.max_active = 0
+    server, url = start_server()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            segmented_download(url, os.path.join(tmp, 'file.bin'), connections=8,
+                               segment_size=64 * 1024, host_limiter=HostLimiter(2))
+    finally:
+        server.shutdown()
+    assert RangeHandler.max_active <= 2
+
+
+def test_dropped_connection_resumes_segment():
+    RangeHandler.ranges = []
+    server, url = start_server()
+    updates = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'file.bin')
+            RangeHandler.drop_after = 1024 * 1024
+            segmented_download(url, path, connections=1, segment_size=len(PAYLOAD),
+                               progress_callback=updates.append)
+            with open(path, 'rb') as f:
+                assert f.read() == PAYLOAD
+    finally:
+        RangeHandler.drop_after = None
+        server.shutdown()
+    # The retry asks only for the bytes the dropped connection didn't deliver
+    retry_start = int(RangeHandler.ranges[-1].split('=')[1].split('-')[0])
+    assert retry_start >= 1024 * 1024
+    assert updates[-1]['downloaded_bytes'] == len(PAYLOAD)
+
+
+def test_server_error_is_retried():
+    RangeHandler.ranges = []
+    server, url = start_server()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'file.bin')
+            RangeHandler.fail_request = 6
+            segmented_download(url, path, connections=2, segment_size=256 * 1024)
+            with open(path, 'rb') as f:
+                assert f.read() == PAYLOAD
+    finally:
+        RangeHandler.fail_request = None
+        server.shutdown()
+    # One probe, one request per segment and one retry
+    segments = -(-len(PAYLOAD) // (256 * 1024))
+    assert len(RangeHandler.ranges) == segments + 2
+
+
+def test_server_error_keeps_finished_segments():
+    server, url = start_server()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'file.bin')
+            RangeHandler.ranges = []
+            RangeHandler.fail_request = 6
+            try:
+                SegmentedDownload(url, path, connections=1, segment_size=256 * 1024, retries=0).run()
+            except requests.HTTPError:
+                pass
+            else:
+                raise AssertionError('Expected HTTPError')
+            assert os.path.exists(path + '.seg.part') and os.path.exists(path + '.seg.json')
+
+            download = SegmentedDownload(url, path, connections=2, segment_size=256 * 1024)
+            download.run()
+            with open(path, 'rb') as f:
+                assert f.read() == PAYLOAD
+            assert download.resumed_bytes == 4 * 256 * 1024
+    finally:
+        RangeHandler.fail_request = None
+        server.shutdown()
+
+
+class Interrupted(Exception):
+    pass
+
+
+def test_interrupted_download_resumes():
+    server, url = start_server()
+
+    def interrupt(d):
+        if d['downloaded_bytes'] > len(PAYLOAD) // 2:
+            raise Interrupted
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'file.bin')
+            try:
+                segmented_download(url, path, connections=1, segment_size=256 * 1024,
+                                   progress_callback=interrupt)
+            except Interrupted:
+                pass
+            assert os.path.exists(path + '.seg.json')
+
+            download = SegmentedDownload(url, path, connections=2, segment_size=256 * 1024)
+            download.run()
+            with open(path, 'rb') as f:
+                assert f.read() == PAYLOAD
+            assert download.resumed_bytes >= len(PAYLOAD) // 2 - 256 * 1024
+            assert not os.path.exists(path + '.seg.json')
+    finally:
+        server.shutdown()
+
+
+def test_server_without_ranges_is_rejected():
+    RangeHandler.supports_ranges = False
+    server, url = start_server()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            try:
+                segmented_download(url, os.path.join(tmp, 'file.bin'))
+            except RangeNotSupported:
+                pass
+            else:
+                raise AssertionError('Expected RangeNotSupported')
+    finally:
+        RangeHandler.supports_ranges = True
+        server.shutdown()
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Segmented Download Tests")
+    print("=" * 40)
+
+    failed = False
+    for test in (test_segmented_download_reassembles_file,
+                 test_host_limiter_caps_connections,
+                 test_dropped_connection_resumes_segment,
+                 test_server_error_is_retried,
+                 test_server_error_keeps_finished_segments,
+                 test_interrupted_download_resumes,
+                 test_server_without_ranges_is_rejected):
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e}")
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
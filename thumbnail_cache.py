@@ -0,0 +1,177 @@
+"""
+Thumbnail cache with resized variants
+Each thumbnail is fetched from its origin once, resized to a few standard
+widths with Pillow and kept on disk (LRU byte quota) with the most used
+variants also held in memory.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+# Widths served by /api/thumbnail; requests are rounded up to one of these
+THUMBNAIL_WIDTHS = (120, 320, 480, 720)
+
+
+def snap_width(width):
+    """Round a requested width up to the nearest standard width"""
+    for standard in THUMBNAIL_WIDTHS:
+        if width <= standard:
+            return standard
+    return THUMBNAIL_WIDTHS[-1]
+
+
+def resize_variants(data, widths=THUMBNAIL_WIDTHS, quality=85):
+    """Return {width: JPEG bytes} for an image, never upscaling past the original"""
+    from PIL import Image
+
+    variants = {}
+    for width in widths:
+        image = Image.open(BytesIO(data))
+        # Let the JPEG decoder scale down while decoding, which is much cheaper
+        image.draft('RGB', (width, image.height * width // max(image.width, 1)))
+        image = image.convert('RGB')
+        if image.width > width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        out = BytesIO()
+        image.save(out, 'JPEG', quality=quality, optimize=True, progressive=True)
+        variants[width] = out.getvalue()
+    return variants
+
+
+class ThumbnailCache:
+    """Resized thumbnails on disk and in memory, fetched at most once per video"""
+
+    def __init__(self, root, max_bytes=200 * 1024 ** 2, memory_entries=256, timeout=10):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.timeout = timeout
+        self._memory = OrderedDict()  # filename -> bytes
+        self._files = OrderedDict()  # filename -> size, least recently used first
+        self._fetching = {}  # key -> Event for origin fetches in progress
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.fetches = 0
+        self.evictions = 0
+        os.makedirs(self.root, exist_ok=True)
+        entries = sorted(os.scandir(self.root), key=lambda entry: entry.stat().st_atime)
+        for entry in entries:
+            if entry.name.endswith('.jpg'):
+                self._files[entry.name] = entry.stat().st_size
+
+    @staticmethod
+    def _filename(key, width):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+        return f"{digest}_{width}.jpg"
+
+    def get(self, key, width, origin):
+        """Return (filename, JPEG bytes) of a thumbnail variant, fetching the origin on a miss
+
+        `key` identifies the video (e.g. 'youtube:<id>'); `width` must be one
+        of THUMBNAIL_WIDTHS. `origin` is only called on a miss and returns
+        the original image URL; when it returns None, so does get(). Raises
+        requests.RequestException or OSError if the origin can't be fetched
+        or decoded.
+        """
+        filename = self._filename(key, width)
+        while True:
+            data = self._lookup(filename)
+            if data is not None:
+                return filename, data
+            with self._lock:
+                event = self._fetching.get(key)
+                if event is None:
+                    event = self._fetching[key] = threading.Event()
+                    break
+            # Another request is fetching this thumbnail; wait for it instead of fetching again
+            event.wait(self.timeout)
+        try:
+            origin_url = origin()
+            if not origin_url:
+                return None
+            self._fetch(key, origin_url)
+        finally:
+            with self._lock:
+                self._fetching.pop(key, None)
+            event.set()
+        return filename, self._lookup(filename)
+
+    def _lookup(self, filename):
+        with self._lock:
+            data = self._memory.get(filename)
+            if data is not None:
+                self._memory.move_to_end(filename)
+                if filename in self._files:
+                    self._files.move_to_end(filename)
+                self.memory_hits += 1
+                return data
+        # Also look for files written by other processes sharing the directory
+        try:
+            with open(os.path.join(self.root, filename), 'rb') as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self._files.pop(filename, None)
+            return None
+        with self._lock:
+            self._files[filename] = len(data)
+            self._files.move_to_end(filename)
+            self.disk_hits += 1
+            self._remember(filename, data)
+        return data
+
+    def _remember(self, filename, data):
+        self._memory[filename] = data
+        self._memory.move_to_end(filename)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _fetch(self, key, origin_url):
+        import requests
+        response = requests.get(origin_url, timeout=self.timeout)
+        response.raise_for_status()
+        variants = resize_variants(response.content)
+        with self._lock:
+            self.fetches += 1
+        for width, data in variants.items():
+            filename = self._filename(key, width)
+            tmp_path = os.path.join(self.root, f"{filename}.{os.getpid()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, os.path.join(self.root, filename))
+            with self._lock:
+                self._files[filename] = len(data)
+                self._files.move_to_end(filename)
+                self._remember(filename, data)
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        # Drop least recently used files until the cache fits its quota
+        total = sum(self._files.values())
+        while total > self.max_bytes and len(self._files) > 1:
+            filename, size = self._files.popitem(last=False)
+            try:
+                os.remove(os.path.join(self.root, filename))
+            except OSError:
+                pass
+            self._memory.pop(filename, None)
+            total -= size
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'files': len(self._files),
+                'bytes': sum(self._files.values()),
+                'max_bytes': self.max_bytes,
+                'memory_entries': len(self._memory),
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'fetches': self.fetches,
+                'evictions': self.evictions
+            }